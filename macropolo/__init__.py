@@ -1,13 +1,17 @@
 # -*- coding: utf-8 -*-
 # flake8: noqa
 
+__version__ = '0.3.0'
+
 from .macrotestcase import MacroTestCaseMixin, MacroTestCase
 from .jsonspec import JSONSpecTestCaseFactory, JSONTestCaseLoader
+from .jsonspec import JSONTestSuiteLoader
 
 __all__ = [
     'MacroTestCaseMixin', 
     'MacroTestCase',
     'JSONSpecTestCaseFactory', 
     'JSONTestCaseLoader',
+    'JSONTestSuiteLoader',
     'environments',
 ]
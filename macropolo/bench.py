@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import timeit
+
+from .history import record_id, iter_tests
+from .jsonspec import prepare_spec_test
+
+# tracemalloc is only available on Python 3.4+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def percentile(samples, p):
+    """
+    Return the p-th percentile of the given samples, by nearest rank.
+    """
+    ordered = sorted(samples)
+    rank = int(math.ceil(p / 100.0 * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+def mann_whitney_p(new, old):
+    """
+    Return the one-sided p-value of the Mann-Whitney U test that the
+    `new` samples tend to be larger than the `old` ones, using the normal
+    approximation.
+    """
+    combined = sorted([(x, 0) for x in new] + [(x, 1) for x in old])
+
+    # Rank the samples, averaging the ranks of ties.
+    ranks = [0.0] * len(combined)
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2.0 + 1
+        i = j + 1
+
+    n1, n2 = len(new), len(old)
+    rank_sum = sum(r for r, (x, group) in zip(ranks, combined) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2.0
+    sigma = math.sqrt(n1 * n2 * (n1 + n2 + 1) / 12.0)
+    if sigma == 0:
+        return 1.0
+    z = (u - n1 * n2 / 2.0 - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def bench_test(test, repeat=50, warmup=5):
+    """
+    Render the macro of the given JSON spec test `warmup` + `repeat`
+    times, setting up its environment and mocks before each render as
+    the test would, and return a dict of the `repeat` render times, the
+    size of the output and, if tracemalloc is available, the peak memory
+    allocated by a render. Only rendering the template returned by the
+    test's `macro_template()` is measured.
+    """
+    method = getattr(type(test), test._testMethodName)
+    test_dict = method.load_test_dict()
+
+    def prepare():
+        # Building the environment and compiling the template that calls
+        # the macro is test harness overhead, so it isn't measured.
+        test.setUp()
+        args, kwargs = prepare_spec_test(test, test_dict)
+        return test.macro_template(method.macro_file, method.macro_name,
+                                   *args, **kwargs)
+
+    samples = []
+    for i in range(warmup + repeat):
+        template = prepare()
+        start = timeit.default_timer()
+        output = template.render(test.context)
+        duration = timeit.default_timer() - start
+        if i >= warmup:
+            samples.append(duration)
+
+    result = {
+        'macro': '{}:{}'.format(method.macro_file, method.macro_name),
+        'samples': samples,
+        'size': len(output),
+    }
+
+    if tracemalloc is not None:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        template = prepare()
+        before = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        template.render(test.context)
+        result['peak'] = tracemalloc.get_traced_memory()[1] - before
+        if not tracing:
+            tracemalloc.stop()
+
+    return result
+
+
+def bench_suite(suite, repeat=50, warmup=5):
+    """
+    Benchmark every JSON spec test in the given test suite that isn't
+    skipped, and return a dict of the results by spec test id, and a
+    dict of the errors raised by tests that couldn't be rendered.
+    """
+    results = {}
+    errors = {}
+    for test in iter_tests(suite):
+        method = getattr(type(test), test._testMethodName, None)
+        if not hasattr(method, 'load_test_dict') or \
+                getattr(method, '__unittest_skip__', False):
+            continue
+        try:
+            results[record_id(test)] = bench_test(test, repeat, warmup)
+        except Exception as e:
+            errors[record_id(test)] = '{}: {}'.format(type(e).__name__, e)
+        finally:
+            test.tearDown()
+    return results, errors
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump({'macros': results}, f, indent=1, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['macros']
+
+
+def compare(results, baseline, alpha=0.01, threshold=0.05):
+    """
+    Return the ids of the tests in `results` whose render times are
+    significantly slower than in the `baseline`: a one-sided
+    Mann-Whitney U test p-value below `alpha`, and a median more than
+    `threshold` (as a fraction) slower.
+    """
+    regressions = []
+    for test_id, result in sorted(results.items()):
+        old = baseline.get(test_id)
+        if old is None:
+            continue
+        new_median = percentile(result['samples'], 50)
+        old_median = percentile(old['samples'], 50)
+        if new_median > old_median * (1 + threshold) and \
+                mann_whitney_p(result['samples'], old['samples']) < alpha:
+            regressions.append(test_id)
+    return regressions
+
+
+def format_report(results, baseline=None, regressions=()):
+    """
+    Format a report of the benchmark results, with the change in median
+    against the baseline if one is given.
+    """
+    lines = ['{:<50} {:>9} {:>9} {:>9} {:>10} {:>10}'.format(
+        'test', 'p50 ms', 'p90 ms', 'p99 ms', 'size', 'alloc KiB')]
+    for test_id, result in sorted(results.items()):
+        samples = result['samples']
+        line = '{:<50} {:>9.3f} {:>9.3f} {:>9.3f} {:>10} {:>10}'.format(
+            test_id,
+            percentile(samples, 50) * 1000,
+            percentile(samples, 90) * 1000,
+            percentile(samples, 99) * 1000,
+            result['size'],
+            '{:.1f}'.format(result['peak'] / 1024.0)
+            if 'peak' in result else '-')
+        if baseline and test_id in baseline:
+            old_median = percentile(baseline[test_id]['samples'], 50)
+            if old_median:
+                change = percentile(samples, 50) / old_median - 1
+                line += ' {:+.1%}'.format(change)
+        if test_id in regressions:
+            line += ' REGRESSION'
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import unittest
+import importlib
+
+from .history import ORDERS
+from .mutation import OPERATORS
+
+
+def load_class(path):
+    """
+    Import and return the class given as `module:ClassName`, e.g. the
+    base test case class of a template test suite.
+    """
+    module_name, _, class_name = path.partition(':')
+    if not class_name:
+        raise ValueError("expected 'module:ClassName', got '%s'" % path)
+
+    # Allow importing test modules from the current directory.
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+
+def run(args):
+    from .jsonspec import JSONTestSuiteLoader
+    from .history import RunHistory, RecordingResult, write_results
+    super_class = load_class(args.base)
+
+    index = None
+    if args.index or args.index_cache:
+        from .index import MacroIndex
+        index = MacroIndex.for_test_case(super_class,
+                                         cache_file=args.index_cache)
+
+    call_tracer = None
+    if args.trace_calls:
+        from .tracing import CallTracer
+        call_tracer = CallTracer()
+        super_class = type(super_class.__name__, (super_class,),
+                           {'call_tracer': call_tracer})
+
+    result_cache = None
+    if args.result_cache:
+        from .resultcache import ResultCache
+        result_cache = ResultCache(args.result_cache, force=args.force)
+
+    suite = JSONTestSuiteLoader(args.tests_path, super_class,
+                                bounded_memory=args.bounded_memory,
+                                shard=args.shard,
+                                shard_by=args.shard_by,
+                                history=args.history,
+                                order=args.order,
+                                index=index,
+                                result_cache=result_cache)
+    if args.index_cache:
+        index.save()
+
+    resultclasses = [RecordingResult]
+    if args.memory_report:
+        from .memory import MemoryTracingResult
+        resultclasses.append(MemoryTracingResult)
+    resultclass = type('Result', tuple(resultclasses), {})
+
+    runner = unittest.TextTestRunner(verbosity=args.verbosity,
+                                     resultclass=resultclass)
+    result = runner.run(suite)
+
+    if args.memory_report:
+        from .memory import format_memory_report
+        runner.stream.write(format_memory_report(result.peaks))
+
+    if call_tracer is not None:
+        runner.stream.write(call_tracer.report())
+
+    if result_cache is not None:
+        result_cache.save()
+        cached = [r for r in result.records if r['status'] == 'cached']
+        runner.stream.write('{} of {} tests cached\n'.format(
+            len(cached), len(result.records)))
+
+    if args.results:
+        write_results(args.results, result.records, shard=args.shard)
+
+    if args.history:
+        history = RunHistory(args.history)
+        history.record_results(result.records)
+        history.save()
+
+    return 0 if result.wasSuccessful() else 1
+
+
+def merge_results(args):
+    from .history import RunHistory, read_results, junit_xml
+    records = read_results(args.results)
+
+    with open(args.junit, 'wb') as f:
+        f.write(junit_xml(records))
+
+    if args.history:
+        history = RunHistory(args.history)
+        history.record_results(records)
+        history.save()
+
+
+def macros(args):
+    from .index import MacroIndex
+    super_class = load_class(args.base)
+    index = MacroIndex.for_test_case(super_class,
+                                     cache_file=args.index_cache)
+    if args.macro_name:
+        signatures = index.find(args.macro_name)
+    else:
+        index.build()
+        signatures = [m for template in sorted(index.templates())
+                      for m in index.macros(template).values()]
+    if args.index_cache:
+        index.save()
+
+    for signature in signatures:
+        sys.stdout.write('{}\n'.format(signature))
+    return 0 if signatures else 1
+
+
+def watch(args):
+    from .watch import SpecWatcher
+    super_class = load_class(args.base)
+    SpecWatcher(args.tests_path, super_class,
+                interval=args.interval).watch()
+
+
+def bench(args):
+    from .jsonspec import JSONTestSuiteLoader
+    from .bench import (bench_suite, compare, format_report, load_baseline,
+                        save_baseline)
+    super_class = load_class(args.base)
+    suite = JSONTestSuiteLoader(args.tests_path, super_class)
+    results, errors = bench_suite(suite, repeat=args.repeat,
+                                  warmup=args.warmup)
+
+    baseline = None
+    regressions = []
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        regressions = compare(results, baseline, threshold=args.threshold)
+
+    sys.stdout.write(format_report(results, baseline, regressions))
+    for test_id, error in sorted(errors.items()):
+        sys.stdout.write('{} ERROR {}\n'.format(test_id, error))
+
+    if args.save:
+        save_baseline(args.save, results)
+
+    return 1 if regressions or errors else 0
+
+
+def mutate(args):
+    from .mutation import (MutationTester, format_mutation_report,
+                           mutation_score)
+    super_class = load_class(args.base)
+    tester = MutationTester(args.tests_path, super_class,
+                            processes=args.processes,
+                            operators=args.operators or OPERATORS,
+                            templates=args.templates)
+    results = tester.run()
+    sys.stdout.write(format_mutation_report(results))
+
+    if args.min_score is not None and \
+            mutation_score(results) < args.min_score:
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='macropolo',
+        description='Run Macro Polo JSON template test specifications.')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser(
+        'run', help='run JSON test specifications')
+    run_parser.add_argument('tests_path',
+        help='directory containing JSON test specifications')
+    run_parser.add_argument('--base', required=True,
+        help='base test case class, as module:ClassName')
+    run_parser.add_argument('-v', '--verbose', dest='verbosity',
+        action='store_const', const=2, default=1,
+        help='verbose output')
+    run_parser.add_argument('--bounded-memory', action='store_true',
+        help='release rendered results and environments after each test')
+    run_parser.add_argument('--memory-report', action='store_true',
+        help='report the peak memory used by each spec file')
+    run_parser.add_argument('--shard', metavar='i/N',
+        help='only run the i-th of N shards of the specs')
+    run_parser.add_argument('--shard-by', choices=['file', 'test'],
+        default='file',
+        help='assign spec files or individual tests to shards')
+    run_parser.add_argument('--history', metavar='FILE',
+        help='status and timing history of previous runs, used to '
+             'balance shards and order tests, and updated by this run')
+    run_parser.add_argument('--order', choices=ORDERS,
+        help='order tests by their status and duration in the history')
+    run_parser.add_argument('--results', metavar='FILE',
+        help='write the status and duration of each test to FILE')
+    run_parser.add_argument('--index', action='store_true',
+        help='check specs against an index of macro signatures before '
+             'rendering')
+    run_parser.add_argument('--index-cache', metavar='FILE',
+        help='read and update the macro index in FILE (implies --index)')
+    run_parser.add_argument('--trace-calls', action='store_true',
+        help='report how often each macro calls each filter and mocked '
+             'context function per render')
+    run_parser.add_argument('--result-cache', metavar='FILE',
+        help='skip tests that passed with the same spec and templates, '
+             'recorded in FILE, and record tests that pass')
+    run_parser.add_argument('--force', action='store_true',
+        help='run all tests even if their results are cached')
+    run_parser.set_defaults(func=run)
+
+    merge_parser = subparsers.add_parser(
+        'merge-results',
+        help='merge the results of several runs into JUnit XML')
+    merge_parser.add_argument('results', nargs='+',
+        help='results files written by run --results')
+    merge_parser.add_argument('--junit', required=True, metavar='FILE',
+        help='JUnit XML file to write')
+    merge_parser.add_argument('--history', metavar='FILE',
+        help='timing history to update with the merged results')
+    merge_parser.set_defaults(func=merge_results)
+
+    macros_parser = subparsers.add_parser(
+        'macros', help='list macro signatures, or find where a macro is '
+                       'defined')
+    macros_parser.add_argument('macro_name', nargs='?',
+        help='only list macros with this name')
+    macros_parser.add_argument('--base', required=True,
+        help='base test case class, as module:ClassName')
+    macros_parser.add_argument('--index-cache', metavar='FILE',
+        help='read and update the macro index in FILE')
+    macros_parser.set_defaults(func=macros)
+
+    watch_parser = subparsers.add_parser(
+        'watch',
+        help='rerun the specs affected by template and spec changes')
+    watch_parser.add_argument('tests_path',
+        help='directory containing JSON test specifications')
+    watch_parser.add_argument('--base', required=True,
+        help='base test case class, as module:ClassName')
+    watch_parser.add_argument('--interval', type=float, default=0.25,
+        help='seconds between polls for changes (default: 0.25)')
+    watch_parser.set_defaults(func=watch)
+
+    bench_parser = subparsers.add_parser(
+        'bench',
+        help='benchmark rendering the macro of each spec test')
+    bench_parser.add_argument('tests_path',
+        help='directory containing JSON test specifications')
+    bench_parser.add_argument('--base', required=True,
+        help='base test case class, as module:ClassName')
+    bench_parser.add_argument('--repeat', type=int, default=50,
+        help='timed renders of each macro (default: 50)')
+    bench_parser.add_argument('--warmup', type=int, default=5,
+        help='untimed renders of each macro first (default: 5)')
+    bench_parser.add_argument('--save', metavar='FILE',
+        help='save the results as a baseline in FILE')
+    bench_parser.add_argument('--compare', metavar='FILE',
+        help='compare the results to the baseline in FILE and fail on '
+             'significant regressions')
+    bench_parser.add_argument('--threshold', type=float, default=0.05,
+        help='slowdown of the median render time, as a fraction, that '
+             'counts as a regression when significant (default: 0.05)')
+    bench_parser.set_defaults(func=bench)
+
+    mutate_parser = subparsers.add_parser(
+        'mutate',
+        help='check that the specs catch mutations of the macros they test')
+    mutate_parser.add_argument('tests_path',
+        help='directory containing JSON test specifications')
+    mutate_parser.add_argument('--base', required=True,
+        help='base test case class, as module:ClassName')
+    mutate_parser.add_argument('-j', '--processes', type=int,
+        help='worker processes to run mutants in (default: one per CPU)')
+    mutate_parser.add_argument('--template', dest='templates',
+        action='append', metavar='TEMPLATE',
+        help='only mutate this template (may be repeated)')
+    mutate_parser.add_argument('--operator', dest='operators',
+        action='append', choices=OPERATORS,
+        help='only apply this mutation operator (may be repeated)')
+    mutate_parser.add_argument('--min-score', type=float, metavar='SCORE',
+        help='exit with an error if the fraction of mutants killed is '
+             'below SCORE')
+    mutate_parser.set_defaults(func=mutate)
+
+    args = parser.parse_args(argv)
+    if not hasattr(args, 'func'):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+
+class MemoizedFilter(object):
+    """
+    A wrapper for a pure template filter that caches up to `maxsize`
+    results keyed on the filter's arguments, evicting the least recently
+    used. Calls with unhashable arguments are passed straight through.
+    """
+
+    def __init__(self, filter, maxsize=1024):
+        self.filter = filter
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, *args, **kwargs):
+        key = args
+        if kwargs:
+            key += (object,) + tuple(sorted(kwargs.items()))
+
+        try:
+            result = self.cache.pop(key)
+        except TypeError:
+            # Unhashable arguments can't be cached.
+            self.misses += 1
+            return self.filter(*args, **kwargs)
+        except KeyError:
+            self.misses += 1
+            result = self.filter(*args, **kwargs)
+            if len(self.cache) >= self.maxsize:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+
+        # (Re)insert the result as the most recently used.
+        self.cache[key] = result
+        return result
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+class FilterRegistry(object):
+    """
+    A process-wide registry of template filters that are built once
+    and shared by every test, rather than being recreated in each
+    test's `setup_environment()`.
+
+    Filters registered as `pure`, i.e. filters whose result depends only
+    on their arguments, are memoized with a bounded LRU cache.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.filters = {}
+
+    def register(self, name, filter, pure=False):
+        """
+        Register the given filter under the given name, replacing any
+        filter already registered with that name.
+        """
+        if pure:
+            filter = MemoizedFilter(filter, maxsize=self.maxsize)
+        self.filters[name] = filter
+        return filter
+
+    def memoized(self):
+        """
+        Return a dict of the memoized filters by name.
+        """
+        return {name: f for name, f in self.filters.items()
+                if isinstance(f, MemoizedFilter)}
+
+    def hit_rate(self):
+        """
+        Return the fraction of calls to memoized filters that were
+        answered from their caches.
+        """
+        hits = sum(f.hits for f in self.memoized().values())
+        calls = hits + sum(f.misses for f in self.memoized().values())
+        return float(hits) / calls if calls else 0.0
+
+    def clear(self):
+        """
+        Clear the caches of all memoized filters.
+        """
+        for f in self.memoized().values():
+            f.clear()
+
+    def report(self):
+        """
+        Return a report of the cache hit rate for each memoized filter.
+        """
+        lines = ['Filter cache hit rate: {:.1%}'.format(self.hit_rate())]
+        for name, f in sorted(self.memoized().items()):
+            calls = f.hits + f.misses
+            lines.append('  {}: {} hits / {} calls'.format(
+                name, f.hits, calls))
+        return '\n'.join(lines) + '\n'
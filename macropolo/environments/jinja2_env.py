@@ -8,6 +8,79 @@ from bs4 import BeautifulSoup
 
 from jinja2 import Environment
 from jinja2 import ChoiceLoader, FileSystemLoader, DictLoader
+from jinja2 import BaseLoader, BytecodeCache, TemplateNotFound
+from jinja2.bccache import Bucket
+
+from ..streaming import StreamingResult
+
+
+class MemoryBytecodeCache(BytecodeCache):
+    """
+    A process-wide, in-memory Jinja2 bytecode cache. Every test builds
+    its own `Environment`, so without this each render recompiles every
+    template it loads. Buckets are validated against the template
+    source's checksum, so a changed template is simply recompiled.
+    """
+
+    def __init__(self):
+        self.bytecode = {}
+
+    def get_bucket(self, environment, name, filename, source):
+        # Jinja2 checks that the filters a template uses exist when it's
+        # compiled, so templates compiled for environments with different
+        # filters (i.e. different mocks) can't be shared.
+        key = self.get_cache_key(name, filename) + '|' + \
+            self.get_source_checksum('|'.join(sorted(environment.filters)))
+        bucket = Bucket(environment, key, self.get_source_checksum(source))
+        self.load_bytecode(bucket)
+        return bucket
+
+    def load_bytecode(self, bucket):
+        code = self.bytecode.get(bucket.key)
+        if code is not None:
+            bucket.bytecode_from_string(code)
+
+    def dump_bytecode(self, bucket):
+        self.bytecode[bucket.key] = bucket.bytecode_to_string()
+
+    def clear(self):
+        self.bytecode.clear()
+
+
+class RecordingLoader(BaseLoader):
+    """
+    A loader that wraps another loader and records the source of every
+    template loaded through it, by name, in `sources`.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.sources = {}
+
+    def get_source(self, environment, template):
+        source, filename, uptodate = \
+            self.loader.get_source(environment, template)
+        self.sources[template] = source
+        return source, filename, uptodate
+
+    def list_templates(self):
+        return self.loader.list_templates()
+
+
+# Shared between all Jinja2Environment instances in the process.
+bytecode_cache = MemoryBytecodeCache()
+
+# Search paths by (search_root, search_exceptions), for environments that
+# set `cache_search_paths`.
+search_paths_cache = {}
+
+
+def clear_environment_caches():
+    """
+    Forget all cached search paths and compiled templates.
+    """
+    search_paths_cache.clear()
+    bytecode_cache.clear()
 
 
 class Jinja2Environment(object):
@@ -15,25 +88,57 @@ class Jinja2Environment(object):
     Jinja2 macro test environment mixin for `MacroTestCase`
     """
 
-    def setup_environment(self):
+    # Walking the search root is repeated for every test. Long-running
+    # processes (i.e. `macropolo watch`) can set this to reuse the
+    # search paths found the first time.
+    cache_search_paths = False
+
+    # Template sources by name that are loaded instead of the templates
+    # in the search paths, e.g. mutants of a template (see
+    # `macropolo.mutation`). Mock templates still take precedence.
+    template_overrides = None
+
+    def find_search_paths(self):
         """
-        Set up a Jinja2 environment
+        Walk the search root and return the list of template search
+        paths.
         """
         search_root = self.search_root()
         search_exceptions = self.search_exceptions()
-        self.search_paths = [x[0] for x in os.walk(search_root)
-                                if not x[0].startswith('_') or
-                                    x[0].startswith('.') or
-                                    x[0] in search_exceptions]
+        return [x[0] for x in os.walk(search_root)
+                    if not x[0].startswith('_') or
+                        x[0].startswith('.') or
+                        x[0] in search_exceptions]
+
+    def setup_environment(self):
+        """
+        Set up a Jinja2 environment
+        """
+        if self.cache_search_paths:
+            key = (self.search_root(), tuple(self.search_exceptions() or ()))
+            if key not in search_paths_cache:
+                search_paths_cache[key] = self.find_search_paths()
+            self.search_paths = list(search_paths_cache[key])
+        else:
+            self.search_paths = self.find_search_paths()
         self.filters = {}
         self.context = {}
         self.templates = {}
 
+    def release_environment(self):
+        """
+        Release the Jinja2 environment along with the filters, context
+        and mock templates added for the test.
+        """
+        for attr in ('env', 'filters', 'context', 'templates',
+                     'template_loader'):
+            self.__dict__.pop(attr, None)
+
     def add_filter(self, name, filter):
         """
         Add the given filter to the template environment.
         """
-        self.filters[name] = filter
+        self.filters[name] = self.trace_calls('filter', name, filter)
 
     def add_context(self, name, value):
         """
@@ -50,6 +155,24 @@ class Jinja2Environment(object):
             self.templates[name] = {}
         self.templates[name][macro_name] = contents
 
+    def loaded_template_sources(self):
+        """
+        Return the sources of the templates loaded from the search paths
+        by the last render, by name. Mock templates aren't included.
+        """
+        return dict(self.template_loader.sources)
+
+    def get_template_source(self, name):
+        """
+        Return the source of the template with the given name in the
+        search paths, or None if there isn't one.
+        """
+        env = Environment(loader=FileSystemLoader(self.search_paths))
+        try:
+            return env.loader.get_source(env, name)[0]
+        except TemplateNotFound:
+            return None
+
     def render_macro(self, macro_file, macro, *args, **kwargs):
         """
         Render a given macro with the given arguments and keyword
@@ -59,6 +182,36 @@ class Jinja2Environment(object):
         calls the macro and renders that template and returns the
         result.
         """
+        result = self.render_macro_string(macro_file, macro, *args, **kwargs)
+        return BeautifulSoup(result, "html.parser")
+
+    def render_macro_string(self, macro_file, macro, *args, **kwargs):
+        """
+        Render a given macro with the given arguments and keyword
+        arguments. Returns the rendered string.
+        """
+        test_template = self.macro_template(macro_file, macro,
+                                            *args, **kwargs)
+        return test_template.render(self.context)
+
+    def render_macro_stream(self, macro_file, macro, *args, **kwargs):
+        """
+        Render a given macro with the given arguments and keyword
+        arguments as a stream. Returns a StreamingResult that parses
+        the output incrementally, as assertions need it.
+        """
+        test_template = self.macro_template(macro_file, macro,
+                                            *args, **kwargs)
+        return StreamingResult(test_template.generate(self.context))
+
+    def macro_template(self, macro_file, macro, *args, **kwargs):
+        """
+        Build the Jinja2 environment for the test and return a template
+        that calls the given macro with the given arguments.
+        """
+        if self.call_tracer is not None:
+            self.call_tracer.begin_render(
+                '{}:{}'.format(macro_file, macro))
 
         # Add our mock templates to the template dict
         mock_templates = {}
@@ -73,10 +226,14 @@ class Jinja2Environment(object):
             mock_templates[name] = "\n".join(macros)
 
         # Build an environment
-        fs_loader = FileSystemLoader(self.search_paths)
-        mock_template_loader = DictLoader(mock_templates)
-        self.env = Environment(loader=ChoiceLoader(
-            [mock_template_loader, fs_loader]))
+        self.template_loader = RecordingLoader(
+            FileSystemLoader(self.search_paths))
+        loaders = [DictLoader(mock_templates)]
+        if self.template_overrides:
+            loaders.append(DictLoader(self.template_overrides))
+        loaders.append(self.template_loader)
+        self.env = Environment(loader=ChoiceLoader(loaders),
+                               bytecode_cache=bytecode_cache)
         for f in self.filters:
             self.env.filters[f] = self.filters[f]
 
@@ -94,7 +251,4 @@ class Jinja2Environment(object):
             {{{{ m.{macro}({args}) }}}}
         '''.format(macro_file=macro_file, macro=macro, args=str_combined)
 
-        test_template = self.env.from_string(test_template_str)
-
-        result = test_template.render(self.context)
-        return BeautifulSoup(result, "html.parser")
+        return self.env.from_string(test_template_str)
@@ -3,9 +3,27 @@
 import markdown
 from sheer.templates import date_formatter
 
+from .filters import FilterRegistry
 from .jinja2_env import Jinja2Environment
 
 
+# Sheer filters that are added to the default. These are generally
+# filters we don't need to worry about mocking. We'll mock Sheer filters
+# that return data from Elasticsearch with `mock_filter()` on a
+# macro-by-macro basis. The registry is built once per process; other
+# Sheer filters can be added to it with `sheer_filters.register()`.
+# XXX: We should change Sheer to make it easier to replicate its
+# environment.
+sheer_filters = FilterRegistry()
+
+sheer_filters.register(
+    'date',
+    lambda value, format="%Y-%m-%d", tz="America/New_York":
+        date_formatter(value, format),
+    pure=True)
+sheer_filters.register('markdown', markdown.markdown, pure=True)
+
+
 class SheerEnvironment(Jinja2Environment):
 
     def setup_environment(self):
@@ -16,13 +34,5 @@ class SheerEnvironment(Jinja2Environment):
         # Setup the Jinja2 environment
         super(SheerEnvironment, self).setup_environment()
 
-        # Sheer filters that are added to the default. These are generally
-        # filters we don't need to worry about mocking. We'll mock Sheer
-        # filters that return data from Elasticsearch with `mock_filter()`
-        # on a macro-by-macro basis. Using lambdas here for brevity.
-        # XXX: We should change Sheer to make it easier to replicate its
-        # environment.
-        self.filters['date'] = lambda value, format="%Y-%m-%d", \
-            tz="America/New_York": date_formatter(value, format)
-        self.filters['markdown'] = lambda raw_text: \
-            markdown.markdown(raw_text)
+        # Add the shared Sheer filters.
+        self.filters.update(sheer_filters.filters)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import mmap
+
+
+# Fixture files that have been loaded in this process, by absolute path,
+# along with their mtime when they were loaded.
+fixture_files = {}
+
+# Decoded lazy fixtures, shared by every `LazyFixture` of the same file,
+# pointer and slice, by (absolute path, pointer, start, stop), along with
+# the file's mtime when it was decoded.
+lazy_fixture_values = {}
+
+
+# This is a function to convert unicode() objects to str() objects that
+# are unicode-encoded. This should above output in our template like
+# "u'foo'" which Jinja2 can't understand.
+def uniconvert(input):
+    if isinstance(input, dict):
+        return {uniconvert(key): uniconvert(value)
+                for key, value in input.items()}
+    elif isinstance(input, list):
+        return [uniconvert(element) for element in input]
+    # UGH!
+    elif sys.version_info < (3,) and isinstance(input, unicode):
+        return input.encode('utf-8')
+    else:
+        return input
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("fixtures are read-only, use an object with a '$ref' "
+                    "and the values to override instead")
+
+
+class FrozenDict(dict):
+    """
+    A read-only dict, used for fixture objects that are shared by all
+    the tests that reference them. `copy()` returns a mutable dict.
+    """
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def copy(self):
+        return dict(self)
+
+
+class FrozenList(list):
+    """
+    A read-only list, used for fixture arrays that are shared by all the
+    tests that reference them.
+    """
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    __setslice__ = __delslice__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+
+
+def freeze(value):
+    """
+    Return a read-only view of the given JSON value.
+    """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    elif isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    elif isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+def load_fixture_file(path):
+    """
+    Load, normalize and freeze the JSON fixture file at the given path,
+    once per process, or again if it has been modified.
+    """
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    cached = fixture_files.get(path)
+    if cached is None or cached[0] != mtime:
+        try:
+            with open(path) as f:
+                value = freeze(uniconvert(json.load(f)))
+        except ValueError as e:
+            e.args += (' in ' + path,)
+            raise
+        cached = (mtime, value)
+        fixture_files[path] = cached
+    return cached[1]
+
+
+def resolve_pointer(document, pointer, ref):
+    """
+    Return the value the given JSON pointer refers to in the document.
+    """
+    value = document
+    for part in filter(None, pointer.split('/')):
+        part = part.replace('~1', '/').replace('~0', '~')
+        try:
+            if isinstance(value, list):
+                part = int(part)
+            value = value[part]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise ValueError("unable to resolve $ref '%s'" % ref)
+    return value
+
+
+class LazyFixture(object):
+    """
+    A large JSON or NDJSON (one JSON record per line, with the extension
+    .ndjson or .jsonl) fixture file that is decoded the first time it's
+    loaded, e.g. the first time a mock returning it is called, rather
+    than when the spec is loaded.
+
+    If `start` or `stop` are given only that slice of the records is
+    returned. NDJSON files are memory-mapped and read a record at a
+    time, so records outside of the slice are never decoded; JSON files
+    are decoded in full before they're sliced.
+
+    The decoded value is frozen and shared by all lazy fixtures of the
+    same file, pointer and slice in the process, rather than kept by
+    each test that refers to it.
+    """
+
+    def __init__(self, path, pointer='', start=None, stop=None):
+        self.path = path
+        self.pointer = pointer
+        self.start = start
+        self.stop = stop
+
+    def __repr__(self):
+        return '<LazyFixture {}>'.format(self.path)
+
+    @property
+    def key(self):
+        return (os.path.abspath(self.path), self.pointer, self.start,
+                self.stop)
+
+    @property
+    def loaded(self):
+        cached = lazy_fixture_values.get(self.key)
+        return cached is not None and \
+            cached[0] == os.path.getmtime(self.path)
+
+    def load(self):
+        mtime = os.path.getmtime(self.path)
+        cached = lazy_fixture_values.get(self.key)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, freeze(uniconvert(self.decode())))
+            lazy_fixture_values[self.key] = cached
+        return cached[1]
+
+    def decode(self):
+        if os.path.splitext(self.path)[1] in ('.ndjson', '.jsonl'):
+            with open(self.path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return []
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    return self.decode_records(mapped)
+                finally:
+                    mapped.close()
+
+        try:
+            with open(self.path) as f:
+                value = json.load(f)
+        except ValueError as e:
+            e.args += (' in ' + self.path,)
+            raise
+        value = resolve_pointer(value, self.pointer, self.path)
+        if self.start is not None or self.stop is not None:
+            value = value[self.start:self.stop]
+        return value
+
+    def decode_records(self, mapped):
+        start = self.start or 0
+        records = []
+        index = 0
+        for line in iter(mapped.readline, b''):
+            if not line.strip():
+                continue
+            if self.stop is not None and index >= self.stop:
+                break
+            if index >= start:
+                records.append(json.loads(line.decode('utf-8')))
+            index += 1
+        return resolve_pointer(records, self.pointer, self.path)
+
+
+def contains_lazy(value):
+    """
+    Return whether the given value is or contains a `LazyFixture`.
+    """
+    if isinstance(value, LazyFixture):
+        return True
+    elif isinstance(value, dict):
+        return any(contains_lazy(v) for v in value.values())
+    elif isinstance(value, list):
+        return any(contains_lazy(v) for v in value)
+    return False
+
+
+def load_lazy(value):
+    """
+    Return the given value with any `LazyFixture` in it loaded. Objects
+    and arrays that don't contain one are returned as they are, so
+    shared fixtures stay shared.
+    """
+    if isinstance(value, LazyFixture):
+        return value.load()
+    elif not contains_lazy(value):
+        return value
+    elif isinstance(value, dict):
+        loaded = {k: load_lazy(v) for k, v in value.items()}
+        return FrozenDict(loaded) if isinstance(value, FrozenDict) \
+            else loaded
+    loaded = [load_lazy(v) for v in value]
+    return FrozenList(loaded) if isinstance(value, FrozenList) else loaded
+
+
+def lazy_fixture(value, json_file):
+    """
+    Return a `LazyFixture` for the given `{"$lazy": "<file>",
+    "$slice": [<start>, <stop>]}` object from the spec in `json_file`.
+    "$slice" is optional, and may also be a number of records to take
+    from the start of the file.
+    """
+    path, _, pointer = value['$lazy'].partition('#')
+    path = os.path.join(os.path.dirname(json_file), path)
+    start = stop = None
+    if '$slice' in value:
+        if isinstance(value['$slice'], list):
+            start, stop = value['$slice']
+        else:
+            stop = value['$slice']
+    return LazyFixture(path, pointer, start, stop)
+
+
+def resolve_refs(value, json_file, fixtures=None):
+    """
+    Return the given JSON value from the spec in `json_file` with any
+    `{"$ref": "<ref>"}` objects replaced by the fixture they refer to.
+
+    A ref is either a JSON pointer to a named fixture in the spec, e.g.
+    '#/fixtures/results', or the path of a JSON fixture file relative to
+    the spec, optionally followed by a pointer within it, e.g.
+    'fixtures/results.json#/hits'. Fixtures are read-only and shared, so
+    any other keys of a ref object are applied to a shallow copy of the
+    fixture, leaving everything that isn't overridden shared.
+
+    `{"$lazy": "<file>"}` objects are replaced by a `LazyFixture`.
+    """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    elif isinstance(value, dict):
+        if '$lazy' in value:
+            return lazy_fixture(value, json_file)
+        if '$ref' not in value:
+            return {k: resolve_refs(v, json_file, fixtures)
+                    for k, v in value.items()}
+
+        ref = value['$ref']
+        path, _, pointer = ref.partition('#')
+        if path:
+            document = load_fixture_file(
+                os.path.join(os.path.dirname(json_file), path))
+        elif fixtures is not None:
+            document = {'fixtures': fixtures}
+        else:
+            raise ValueError("$ref '%s' can't refer to a named fixture "
+                             "here" % ref)
+        fixture = resolve_pointer(document, pointer, ref)
+
+        overrides = {k: v for k, v in value.items() if k != '$ref'}
+        if not overrides:
+            return fixture
+        if not isinstance(fixture, dict):
+            raise ValueError("$ref '%s' must refer to an object to "
+                             "override its values" % ref)
+        copy = dict(fixture)
+        copy.update(resolve_refs(overrides, json_file, fixtures))
+        return copy
+    elif isinstance(value, list):
+        return [resolve_refs(v, json_file, fixtures) for v in value]
+    return value
+
+
+def spec_fixtures(spec, json_file):
+    """
+    Return the named fixtures defined in the given spec, resolved and
+    frozen.
+    """
+    return freeze(resolve_refs(spec.get('fixtures', {}), json_file))
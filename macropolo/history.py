@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import unittest
+from xml.etree import ElementTree
+
+from .resultcache import CACHED
+
+
+def spec_test_id(json_file, method_name):
+    """
+    Return the id of the test with the given method name created from
+    the given JSON spec file. The id is stable across machines, e.g.
+    'macros.json::test_0my_macro'.
+    """
+    return os.path.basename(json_file) + '::' + method_name
+
+
+def record_id(test):
+    """
+    Return the spec test id of the given test instance, or its
+    `unittest` id if it wasn't created from a JSON spec.
+    """
+    spec_file = getattr(test, 'spec_file', None)
+    if spec_file is None:
+        return test.id()
+    return spec_test_id(spec_file, test._testMethodName)
+
+
+# Test orderings supported by RunHistory.order()
+ORDERS = ('failed-first', 'longest-first')
+
+
+def iter_tests(suite):
+    """
+    Iterate over the individual tests in a (nested) test suite.
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for t in iter_tests(test):
+                yield t
+        else:
+            yield test
+
+
+class RunHistory(object):
+    """
+    The status and duration of each spec test in previous runs,
+    persisted as JSON in the file at `path`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.tests = json.load(f).get('tests', {})
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'tests': self.tests}, f, indent=1, sort_keys=True)
+
+    def record(self, test_id, status, duration):
+        self.tests[test_id] = {'status': status, 'duration': duration}
+
+    def record_results(self, records):
+        """
+        Record the status and duration of the given test records, e.g.
+        those of a `RecordingResult`. Cached tests weren't run, so they
+        keep the duration of the run that passed.
+        """
+        for record in records:
+            if record['status'] == 'cached':
+                duration = self.tests.get(record['id'], {}).get('duration',
+                                                                 0.0)
+                self.record(record['id'], 'pass', duration)
+            else:
+                self.record(record['id'], record['status'],
+                            record['duration'])
+
+    def order(self, tests, order):
+        """
+        Return the given test instances in the given order:
+
+        * 'longest-first': by duration in the previous run, longest
+          first, so that parallel workers finish together. Tests with
+          no recorded duration, e.g. new tests, are run first.
+        * 'failed-first': tests that failed or errored in the previous
+          run first, then the remaining tests longest-first, with tests
+          that have no recorded duration first among them.
+
+        Tests are otherwise kept in the order given.
+        """
+        if order not in ORDERS:
+            raise ValueError("order must be one of %s, got '%s'" %
+                             (', '.join(ORDERS), order))
+
+        def key(indexed_test):
+            index, test = indexed_test
+            t = self.tests.get(record_id(test))
+            if t is None:
+                return (1, -float('inf'), index)
+            failed = order == 'failed-first' and \
+                t['status'] in ('fail', 'error')
+            return (0 if failed else 1, -t['duration'], index)
+
+        return [test for i, test in sorted(enumerate(tests), key=key)]
+
+    def durations(self):
+        """
+        Return a dict of the last recorded duration of each test.
+        """
+        return {test_id: t['duration'] for test_id, t in self.tests.items()}
+
+    def spec_durations(self):
+        """
+        Return a dict of the total recorded duration of the tests of
+        each spec file.
+        """
+        durations = {}
+        for test_id, t in self.tests.items():
+            spec = test_id.split('::', 1)[0]
+            durations[spec] = durations.get(spec, 0.0) + t['duration']
+        return durations
+
+
+class RecordingResult(unittest.TextTestResult):
+    """
+    A `unittest` result class that records the status, duration and
+    any failure message of each test in `self.records`. Tests skipped by
+    the result cache have the status 'cached'. Errors raised by class and
+    module fixtures, e.g. `setUpClass()`, are recorded under the id
+    `unittest` gives them, e.g. 'setUpClass (module.Class)'.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RecordingResult, self).__init__(*args, **kwargs)
+        self.records = []
+        self._record = None
+
+    def startTest(self, test):
+        self._record = {'id': record_id(test), 'status': 'pass'}
+        self._start_time = time.time()
+        super(RecordingResult, self).startTest(test)
+
+    def stopTest(self, test):
+        super(RecordingResult, self).stopTest(test)
+        self._record['duration'] = time.time() - self._start_time
+        self.records.append(self._record)
+        self._record = None
+
+    def _set_status(self, test, status, message=None):
+        record = self._record
+        if record is None:
+            # Errors raised by class and module fixtures don't start a
+            # test, so they're recorded by themselves.
+            record = {'id': record_id(test), 'duration': 0.0}
+            self.records.append(record)
+        record['status'] = status
+        if message is not None:
+            record['message'] = message
+
+    def addFailure(self, test, err):
+        super(RecordingResult, self).addFailure(test, err)
+        self._set_status(test, 'fail', self._exc_info_to_string(err, test))
+
+    def addError(self, test, err):
+        super(RecordingResult, self).addError(test, err)
+        self._set_status(test, 'error', self._exc_info_to_string(err, test))
+
+    def addSkip(self, test, reason):
+        super(RecordingResult, self).addSkip(test, reason)
+        if reason == CACHED:
+            self._set_status(test, 'cached')
+        else:
+            self._set_status(test, 'skip', reason)
+
+
+def write_results(path, records, shard=None):
+    """
+    Write the given test records, e.g. those of one CI shard, as JSON to
+    the given path.
+    """
+    with open(path, 'w') as f:
+        json.dump({'shard': shard, 'tests': records}, f, indent=1)
+
+
+def read_results(paths):
+    """
+    Read and combine the test records from the given results files.
+    """
+    records = []
+    for path in paths:
+        with open(path) as f:
+            records.extend(json.load(f)['tests'])
+    return records
+
+
+def junit_xml(records):
+    """
+    Return JUnit XML for the given test records, with a test suite for
+    each spec file.
+    """
+    suites = {}
+    for record in records:
+        suite, _, name = record['id'].rpartition('::')
+        suites.setdefault(suite or record['id'], []).append((name, record))
+
+    root = ElementTree.Element('testsuites')
+    for suite_name in sorted(suites):
+        cases = suites[suite_name]
+        statuses = [r['status'] for n, r in cases]
+        suite = ElementTree.SubElement(root, 'testsuite', {
+            'name': suite_name,
+            'tests': str(len(cases)),
+            'failures': str(statuses.count('fail')),
+            'errors': str(statuses.count('error')),
+            'skipped': str(statuses.count('skip')),
+            'time': '%.3f' % sum(r['duration'] for n, r in cases),
+        })
+        for name, record in cases:
+            case = ElementTree.SubElement(suite, 'testcase', {
+                'classname': suite_name,
+                'name': name,
+                'time': '%.3f' % record['duration'],
+            })
+            tag = {'fail': 'failure', 'error': 'error',
+                   'skip': 'skipped'}.get(record['status'])
+            if tag is not None:
+                message = record.get('message', '')
+                element = ElementTree.SubElement(
+                    case, tag, {'message': message.strip().split('\n')[-1]})
+                if tag != 'skipped':
+                    element.text = message
+
+    return ElementTree.tostring(root, encoding='utf-8')
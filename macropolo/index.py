@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import warnings
+
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, nodes
+from jinja2 import meta
+from jinja2 import TemplateSyntaxError
+from jinja2.defaults import DEFAULT_FILTERS, DEFAULT_NAMESPACE
+
+
+# Names that are always available within a macro.
+MACRO_NAMES = frozenset(['varargs', 'kwargs', 'caller', 'loop', 'self',
+                         'super', 'true', 'false', 'none', 'True', 'False',
+                         'None'])
+
+
+class SpecWarning(UserWarning):
+    """
+    A likely problem with a JSON spec found without rendering it, e.g. a
+    filter the macro uses that isn't mocked.
+    """
+    pass
+
+
+class MacroSignature(object):
+    """
+    The signature of a macro found by `MacroIndex`: the template `file`
+    it is defined in, its `name`, its parameters (`args`), the `defaults`
+    of those parameters that have one, whether it accepts extra
+    positional (`varargs`) or keyword (`kwargs`) arguments, and the
+    `filters` and context `names` it references.
+    """
+
+    def __init__(self, file, name, args, defaults, varargs, kwargs,
+                 filters, names):
+        self.file = file
+        self.name = name
+        self.args = list(args)
+        self.defaults = dict(defaults)
+        self.varargs = varargs
+        self.kwargs = kwargs
+        self.filters = set(filters)
+        self.names = set(names)
+
+    def __repr__(self):
+        return '<MacroSignature {}>'.format(self)
+
+    def __str__(self):
+        args = [a + ('=' + repr(self.defaults[a])
+                     if a in self.defaults else '')
+                for a in self.args]
+        if self.varargs:
+            args.append('*varargs')
+        if self.kwargs:
+            args.append('**kwargs')
+        return '{}: {}({})'.format(self.file, self.name, ', '.join(args))
+
+    @classmethod
+    def from_node(cls, file, macro, template_names):
+        """
+        Create a signature from a parsed `nodes.Macro`. `template_names`
+        are the names assigned at the top level of its template.
+        """
+        args = [a.name for a in macro.args]
+        defaults = {}
+        for arg, default in zip(args[len(args) - len(macro.defaults):],
+                                macro.defaults):
+            try:
+                defaults[arg] = default.as_const()
+            except Exception:
+                defaults[arg] = None
+
+        loaded = set()
+        stored = set(args) | template_names
+        for name in macro.find_all(nodes.Name):
+            if name.ctx == 'load':
+                loaded.add(name.name)
+            else:
+                stored.add(name.name)
+        for node in macro.find_all((nodes.Import, nodes.FromImport,
+                                    nodes.Macro)):
+            stored.update(assigned_names(node))
+
+        names = loaded - stored - MACRO_NAMES - set(DEFAULT_NAMESPACE)
+        filters = set(f.name for f in macro.find_all(nodes.Filter))
+        return cls(file, macro.name, args, defaults,
+                   'varargs' in loaded, 'kwargs' in loaded, filters, names)
+
+    def to_json(self):
+        return {'file': self.file, 'name': self.name, 'args': self.args,
+                'defaults': self.defaults, 'varargs': self.varargs,
+                'kwargs': self.kwargs, 'filters': sorted(self.filters),
+                'names': sorted(self.names)}
+
+    def check_call(self, args, kwargs):
+        """
+        Return a description of what is wrong with calling the macro
+        with the given arguments, or None if nothing is.
+        """
+        if len(args) > len(self.args) and not self.varargs:
+            return '{} takes at most {} arguments ({} given)'.format(
+                self.name, len(self.args), len(args))
+        for k in kwargs:
+            if k in self.args[:len(args)]:
+                return '{} got multiple values for argument {}'.format(
+                    self.name, k)
+            if k not in self.args and not self.kwargs:
+                return '{} got an unexpected keyword argument {}'.format(
+                    self.name, k)
+        return None
+
+
+def assigned_names(node):
+    """
+    Return the names assigned by an import, from-import or macro node.
+    """
+    if isinstance(node, nodes.Import):
+        return [node.target]
+    elif isinstance(node, nodes.FromImport):
+        return [n[1] if isinstance(n, tuple) else n for n in node.names]
+    return [node.name]
+
+
+class MacroIndex(object):
+    """
+    An index of the signatures of every macro in the templates found in
+    the given search paths, built by parsing the templates without
+    rendering them.
+
+    Templates are parsed when they are first looked up, or all at once
+    with `build()`. If a `cache_file` is given, signatures are read from
+    and saved to it, and templates are only parsed again when they have
+    been modified.
+    """
+
+    # Extensions of the files in the search paths that are templates.
+    extensions = ('.html', '.htm', '.xml', '.j2', '.jinja', '.jinja2')
+
+    def __init__(self, search_paths, cache_file=None, known_filters=(),
+                 known_names=()):
+        self.env = Environment(loader=FileSystemLoader(search_paths))
+        self.cache_file = cache_file
+        self.known_filters = set(DEFAULT_FILTERS) | set(known_filters)
+        self.known_names = set(known_names)
+
+        # Signatures by template file path, along with the file's mtime
+        # and the syntax error that stopped it being parsed, if any.
+        self.files = {}
+        if cache_file is not None and os.path.exists(cache_file):
+            with open(cache_file) as f:
+                for filename, (mtime, macros, error) in json.load(f).items():
+                    self.files[filename] = (mtime, [
+                        MacroSignature(**m) for m in macros], error)
+
+    @classmethod
+    def for_test_case(cls, super_class, cache_file=None):
+        """
+        Create an index of the templates in the search paths of the
+        given macro test case class, which knows about the filters and
+        context its environment provides.
+        """
+        probe = super_class()
+        probe.setup_environment()
+        return cls(probe.search_paths, cache_file=cache_file,
+                   known_filters=getattr(probe, 'filters', {}),
+                   known_names=getattr(probe, 'context', {}))
+
+    def save(self):
+        with open(self.cache_file, 'w') as f:
+            json.dump({filename: (mtime, [m.to_json() for m in macros], error)
+                       for filename, (mtime, macros, error)
+                       in self.files.items()}, f)
+
+    def macros(self, template):
+        """
+        Return a dict of the signatures of the macros defined in the
+        template with the given name, by macro name.
+        """
+        cached = self.parse(template)
+        return {m.name: m for m in cached[1]} if cached else {}
+
+    def syntax_error(self, template):
+        """
+        Return a description of the syntax error that stopped the
+        template with the given name being parsed, or None.
+        """
+        cached = self.parse(template)
+        return cached[2] if cached else None
+
+    def parse(self, template):
+        """
+        Parse the template with the given name, unless it's cached, and
+        return its mtime, macro signatures and syntax error, or None if
+        the template doesn't exist.
+        """
+        try:
+            source, filename, uptodate = \
+                self.env.loader.get_source(self.env, template)
+        except TemplateNotFound:
+            return None
+
+        mtime = os.path.getmtime(filename)
+        cached = self.files.get(filename)
+        if cached is None or cached[0] != mtime:
+            error = None
+            try:
+                ast = self.env.parse(source)
+            except TemplateSyntaxError as e:
+                error = '{} line {}: {}'.format(template, e.lineno, e.message)
+                ast = nodes.Template([])
+            template_names = set()
+            for node in ast.body:
+                if isinstance(node, (nodes.Import, nodes.FromImport,
+                                     nodes.Macro)):
+                    template_names.update(assigned_names(node))
+                elif isinstance(node, nodes.Assign):
+                    template_names.update(
+                        n.name for n in node.find_all(nodes.Name)
+                        if n.ctx == 'store')
+            macros = [MacroSignature.from_node(template, m, template_names)
+                      for m in ast.find_all(nodes.Macro)]
+            cached = (mtime, macros, error)
+            self.files[filename] = cached
+        return cached
+
+    def templates(self):
+        """
+        Return the names of all templates in the search paths.
+        """
+        return [t for t in self.env.loader.list_templates()
+                if os.path.splitext(t)[1] in self.extensions]
+
+    def build(self):
+        """
+        Parse every template in the search paths, saving the index to
+        the cache file if there is one.
+        """
+        for template in self.templates():
+            self.macros(template)
+        if self.cache_file is not None:
+            self.save()
+        return self
+
+    def find(self, macro_name):
+        """
+        Return the signatures of all macros with the given name.
+        """
+        found = []
+        seen = set()
+        for template in self.templates():
+            source, filename, uptodate = \
+                self.env.loader.get_source(self.env, template)
+            if filename in seen:
+                continue
+            seen.add(filename)
+            if macro_name in self.macros(template):
+                found.append(self.macros(template)[macro_name])
+        return found
+
+    def check_test(self, macro_file, test_dict, json_file=''):
+        """
+        Check a test from a JSON spec against the index. Returns a
+        description of why the test can't pass, if the macro's template
+        has a syntax error, the macro doesn't exist or the arguments
+        don't match its signature, and issues a
+        `SpecWarning` for each filter and context name the macro uses
+        that is neither mocked nor provided by the environment.
+        """
+        error = self.syntax_error(macro_file)
+        if error is not None:
+            return 'syntax error in ' + error
+
+        macro_name = test_dict['macro_name']
+        macro = self.macros(macro_file).get(macro_name)
+        if macro is None:
+            return 'macro {} is not defined in {}'.format(macro_name,
+                                                          macro_file)
+
+        args = test_dict.get('arguments', [])
+        kwargs = test_dict.get('keyword_arguments', {})
+        if isinstance(args, dict):
+            kwargs = args
+            args = []
+        error = macro.check_call(args, kwargs)
+        if error is not None:
+            return error
+
+        mocked = set(test_dict.get('mock_filters', {})) | \
+            set(test_dict.get('filters', {}))
+        for f in sorted(macro.filters - self.known_filters - mocked):
+            warnings.warn('{}: filter {} used by macro {} is not mocked'
+                          .format(json_file, f, macro_name), SpecWarning)
+
+        mocked = set(test_dict.get('context', {})) | \
+            set(test_dict.get('mock_context_functions', {})) | \
+            set(test_dict.get('context_functions', {}))
+        for name in sorted(macro.names - self.known_names - mocked):
+            warnings.warn('{}: {} used by macro {} is not in the context or '
+                          'mocked'.format(json_file, name, macro_name),
+                          SpecWarning)
+        return None
+
+
+class TemplateReferences(object):
+    """
+    The templates imported, included or extended by the templates in
+    the given search paths, found by parsing them. Each template is only
+    parsed again when it has been modified.
+    """
+
+    def __init__(self, search_paths):
+        self.env = Environment(loader=FileSystemLoader(search_paths))
+
+        # Referenced template names by file path, along with the file's
+        # mtime.
+        self.files = {}
+
+    def references(self, name):
+        """
+        Return the names of the templates that are imported, included or
+        extended by the template with the given name.
+        """
+        try:
+            source, filename, uptodate = \
+                self.env.loader.get_source(self.env, name)
+        except TemplateNotFound:
+            return set()
+
+        mtime = os.path.getmtime(filename)
+        cached = self.files.get(filename)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            ast = self.env.parse(source)
+            references = set(n for n in meta.find_referenced_templates(ast)
+                             if n is not None)
+        except TemplateSyntaxError:
+            references = set()
+        self.files[filename] = (mtime, references)
+        return references
+
+    def dependencies(self, name):
+        """
+        Return the names of the given template and every template it
+        transitively references.
+        """
+        seen = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            pending.extend(self.references(current) - seen)
+        return seen
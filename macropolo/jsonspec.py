@@ -1,16 +1,23 @@
 # -*- coding: utf-8 -*-
 
-import sys
 import os
 import json
 import unittest
 
+from .fixtures import uniconvert, resolve_refs, spec_fixtures, load_lazy
+from .history import RunHistory, ORDERS, spec_test_id, iter_tests
+from .resultcache import CACHED, spec_inputs
+from .sharding import parse_shard, assign_shards
 
-def JSONSpecTestCaseFactory(name, super_class, json_file, mixins=[]):
+
+def JSONSpecTestCaseFactory(name, super_class, json_file, mixins=[],
+                            bounded_memory=False, index=None,
+                            result_cache=None, spec=None):
     """
     Creates a test case class of the given `name` with the given
-    `super_class` and `mixins` from JSON read from the given `json_file`.
-    The test case class is returned.
+    `super_class` and `mixins` from JSON read from the given `json_file`,
+    or given as `spec` if it has already been read from it. The test
+    case class is returned.
 
     This factory and JSON specification for test cases are meant to
     simplify the creation of test cases and reduce the amount of
@@ -82,93 +89,131 @@ def JSONSpecTestCaseFactory(name, super_class, json_file, mixins=[]):
                  { ... }
             ]
         }
-    """
-    # This is a function to convert unicode() objects to str() objects that 
-    # are unicode-encoded. This should above output in our template like 
-    # "u'foo'" which Jinja2 can't understand.
-    def uniconvert(input):
-        if isinstance(input, dict):
-            return {uniconvert(key): uniconvert(value) 
-                    for key, value in input.iteritems()}
-        elif isinstance(input, list):
-            return [uniconvert(element) for element in input]
-        # UGH!
-        elif sys.version_info < (3,) and isinstance(input, unicode):
-            return input.encode('utf-8')
-        else:
-            return input
 
+    Values that are repeated across tests can be defined once as named
+    "fixtures" in the spec, or in separate JSON fixture files, and
+    referred to with {"$ref": "#/fixtures/<name>"} or
+    {"$ref": "<fixture file>#/<pointer>"}. See `resolve_refs()`.
+
+    If a `MacroIndex` is given as `index`, tests are checked against it
+    when the spec is loaded: tests of macros that don't exist or that
+    pass arguments the macro doesn't take fail without rendering, and a
+    `SpecWarning` is issued for filters and context names that the macro
+    uses but the test doesn't mock.
+
+    If `bounded_memory` is true, each test's specification is kept as
+    compact JSON until the test runs, and the rendered result and the
+    test's template environment are released once its assertions have
+    been made.
+
+    If a `ResultCache` is given as `result_cache`, tests that passed the
+    last time they were run with the same spec and templates are skipped
+    as cached, and tests that pass are recorded in it.
+    """
     # This function will return a function that can be assigned as a test 
     # method for a macro with the given name in the given file with the give 
     # test_dict from the JSON spec.
     def create_test_method(macro_file, macro_name, test_dict):
+        # Fixture files are only hashed if the test is run.
+        if result_cache is not None:
+            test_inputs = spec_inputs(test_dict, spec, json_file)
+
+        # In bounded memory mode only keep the test's spec as compact JSON
+        # between runs, and resolve its fixture refs when it's run.
+        if bounded_memory:
+            compact_test_dict = json.dumps(test_dict, separators=(',', ':'))
+            test_dict = None
+        else:
+            test_dict = resolve_refs(test_dict, json_file, fixtures)
+
+        def load_test_dict():
+            if bounded_memory:
+                return resolve_refs(uniconvert(json.loads(compact_test_dict)),
+                                    json_file, fixtures)
+            return test_dict
+
         def test_method(self):
-            # Add any context variables to the context
-            [self.add_context(k, v) 
-                    for k, v in test_dict.get('context', {}).items()]
-
-            # Mock the filters and context functions
-            filters = test_dict.get('mock_filters', {})
-            [self.mock_filter(f, v) for f, v in filters.items()]
-            context_functions = test_dict.get('mock_context_functions', {})
-            [self.mock_context_function(f, v) 
-                    for f, v in context_functions.items()]
-            templates = test_dict.get('templates', {})
-            [[self.mock_template_macro(n, m, c) for m, c in d.items()] 
-                    for n, d in templates.items()]
-
-            # Render the macro from the macro file with the given
-            # arguments
-            args = test_dict.get('arguments', [])
-
-            # kwargs can optionally be specified seperately from args
-            kwargs = test_dict.get('keyword_arguments', {})
-
-            # If args is a dict it specifies keyword arguments.
-            # Otherwise assume it's a list of arguments.
-            if isinstance(args, dict):
-                kwargs = args
-                args = []
-
-            result = self.render_macro(macro_file, macro_name,
-                                       *args, **kwargs)
-
-            # Loop over the assertions given for the test and make them.
-            for a in test_dict.get('assertions', []):
-                # Selector is required, the others here have defaults.
-                selector = a['selector']
-                index = a.get('index', 0)
-                assertion = a.get('assertion', 'exists')
-                value = a.get('value')
-                attribute = a.get('attribute', '')
-
-                try:
-                    self.make_assertion(result, selector, index=index,
-                                        value=value, assertion=assertion,
-                                        attribute=attribute)
-                except AssertionError as e:
-                    # Try to provide some more relevent information to the
-                    # assertion error, since by default it'll just say the
-                    # failure was in make_assertion.
-                    assertion_str = ''
-                    if value:
-                        assertion_str += '"' + value + '" '
-                    assertion_str += '"' + assertion + '" "' + \
-                        selector + '" selection '
-
-                    e.args += (assertion_str + 
-                               'failed in macro ' + macro_name + 
-                               ' in ' + macro_file,)
-                    raise e
+            test_dict = load_test_dict()
+
+            args, kwargs = prepare_spec_test(self, test_dict)
+
+            # Skip the test if its spec and the templates it loaded are
+            # unchanged since it last passed.
+            if self.result_cache is not None:
+                test_id = spec_test_id(json_file, self._testMethodName)
+                test_hash = self.result_cache.spec_hash(test_inputs)
+                if self.result_cache.is_cached(test_id, test_hash,
+                                               self.get_template_source):
+                    self.skipTest(CACHED)
+
+            if test_dict.get('stream', self.stream_render):
+                result = self.render_macro_stream(macro_file, macro_name,
+                                                  *args, **kwargs)
+            else:
+                result = self.render_macro(macro_file, macro_name,
+                                           *args, **kwargs)
+            try:
+                # Loop over the assertions given for the test and make them.
+                for a in test_dict.get('assertions', []):
+                    # Selector is required, the others here have defaults.
+                    selector = a['selector']
+                    index = a.get('index', 0)
+                    assertion = a.get('assertion', 'exists')
+                    value = a.get('value')
+                    attribute = a.get('attribute', '')
+
+                    try:
+                        self.make_assertion(result, selector, index=index,
+                                            value=value, assertion=assertion,
+                                            attribute=attribute)
+                    except AssertionError as e:
+                        # Try to provide some more relevent information to the
+                        # assertion error, since by default it'll just say the
+                        # failure was in make_assertion.
+                        assertion_str = ''
+                        if value:
+                            assertion_str += '"' + value + '" '
+                        assertion_str += '"' + assertion + '" "' + \
+                            selector + '" selection '
+
+                        e.args += (assertion_str + 
+                                   'failed in macro ' + macro_name + 
+                                   ' in ' + macro_file,)
+                        raise e
+            finally:
+                # Release the rendered result before the next test.
+                if self.bounded_memory:
+                    result.decompose()
+
+            if self.result_cache is not None:
+                self.result_cache.record(test_id, test_hash,
+                                         self.loaded_template_sources())
+
+        # Let the test be rendered outside of unittest, e.g. by
+        # `macropolo bench`.
+        test_method.macro_file = macro_file
+        test_method.macro_name = macro_name
+        test_method.load_test_dict = load_test_dict
+        return test_method
+
+    # This function will return a test method that fails with the given
+    # message, for tests the index shows can't pass.
+    def create_failing_test_method(message):
+        def test_method(self):
+            self.fail(message)
 
         return test_method
 
     # Open and read the JSON spec file
-    try:
-        spec = uniconvert(json.loads(open(json_file).read()))
-    except ValueError as e:
-        e.args += (' in ' + json_file,)
-        raise
+    if spec is None:
+        spec = read_spec(json_file)
+    if not is_spec(spec):
+        raise ValueError("{} is not a JSON test specification: expected an "
+                         "object with 'file' and 'tests'".format(json_file))
+
+    # Named fixtures are resolved once and shared by the tests that refer
+    # to them.
+    fixtures = spec_fixtures(spec, json_file)
 
     # This will be our new class's dict containing all its methods, etc
     newclass_dict = {}
@@ -181,37 +226,205 @@ def JSONSpecTestCaseFactory(name, super_class, json_file, mixins=[]):
         method_name = 'test_' + str(spec['tests'].index(t)) + macro_name
         test_method = create_test_method(macro_file, macro_name, t)
 
+        if index is not None and not t.get('skip', False):
+            error = index.check_test(macro_file,
+                                     resolve_refs(t, json_file, fixtures),
+                                     json_file)
+            if error is not None:
+                test_method = create_failing_test_method(error)
+
         if t.get('skip', False):
             test_method = unittest.skip(
                 "skipping {}".format(macro_name))(test_method)
 
         newclass_dict[method_name] = test_method
 
+    newclass_dict['spec_file'] = json_file
+    if bounded_memory:
+        newclass_dict['bounded_memory'] = True
+    if result_cache is not None:
+        newclass_dict['result_cache'] = result_cache
+
     # Create and return the new class.
     newclass = type(name, (super_class,), newclass_dict)
     return newclass
 
 
-def JSONTestCaseLoader(tests_path, super_class, context, recursive=False):
+def prepare_spec_test(test_case, test_dict):
+    """
+    Add the context, mock filters, context functions and templates from
+    the given test_dict from a JSON spec to the given test case's
+    environment, and return the arguments and keyword arguments to
+    render its macro with.
+    """
+    # Add any context variables to the context. Lazy fixtures are only
+    # loaded lazily as mock values, so they're loaded here.
+    [test_case.add_context(k, load_lazy(v)) 
+            for k, v in test_dict.get('context', {}).items()]
+
+    # Mock the filters and context functions
+    filters = test_dict.get('mock_filters', {})
+    [test_case.mock_filter(f, v) for f, v in filters.items()]
+    context_functions = test_dict.get('mock_context_functions', {})
+    [test_case.mock_context_function(f, v) 
+            for f, v in context_functions.items()]
+    templates = test_dict.get('templates', {})
+    [[test_case.mock_template_macro(n, m, c) for m, c in d.items()] 
+            for n, d in templates.items()]
+
+    # Arguments to render the macro with
+    args = test_dict.get('arguments', [])
+
+    # kwargs can optionally be specified seperately from args
+    kwargs = test_dict.get('keyword_arguments', {})
+
+    # If args is a dict it specifies keyword arguments.
+    # Otherwise assume it's a list of arguments.
+    if isinstance(args, dict):
+        kwargs = args
+        args = []
+
+    return load_lazy(args), load_lazy(kwargs)
+
+
+def read_spec(json_file):
+    """
+    Read and return the JSON value in the given file.
+    """
+    try:
+        with open(json_file) as f:
+            return uniconvert(json.loads(f.read()))
+    except ValueError as e:
+        e.args += (' in ' + json_file,)
+        raise
+
+
+def is_spec(value):
+    """
+    Return whether the given JSON value is a test specification, i.e. an
+    object with 'file' and 'tests', rather than e.g. a fixture.
+    """
+    return isinstance(value, dict) and 'file' in value and 'tests' in value
+
+
+def spec_class_name(json_file):
+    """
+    Return the test case class name for the given JSON spec file.
+    """
+    # Create a camelcased name for the test. This is a minor thing, but I
+    # think it's nice.
+    name, extension = os.path.splitext(os.path.basename(json_file))
+    return ''.join(x for x in name.title() if x not in ' _-') + 'TestCase'
+
+
+def JSONTestCaseLoader(tests_path, super_class, context, recursive=False,
+                       bounded_memory=False, shard=None, shard_by='file',
+                       history=None, order=None, index=None,
+                       result_cache=None):
     """
     Load JSON specifications for Jinja2 macro test cases from the given
     `tests_path`, calls `JSONSpecTestCaseFactory()` to create test case
     classes with the given `super_class` from the JSON files, and adds the
     resulting test case classes to the given `context` (i.e. `globals()`).
+
+    If a `shard` is given as 'i/N', only the spec files (or, if
+    `shard_by` is 'test', the individual tests) assigned to the i-th of
+    N shards are loaded. Assignment is deterministic, and balanced using
+    the durations recorded in the `history` file, if given.
+
+    If a `MacroIndex` is given as `index`, the tests are checked against
+    it as they're loaded (see `JSONSpecTestCaseFactory()`).
+
+    JSON files in `tests_path` that aren't test specifications, e.g.
+    fixture files, are skipped.
+
+    If a `ResultCache` is given as `result_cache`, unchanged tests that
+    passed before are skipped as cached (see `JSONSpecTestCaseFactory()`).
+
+    If an `order` of 'failed-first' or 'longest-first' is given, a
+    `load_tests()` function is also added to the `context` that orders
+    the tests by their status and duration in the `history` file (see
+    `RunHistory.order()`).
     """
+    if shard is not None:
+        shard_index, shard_count = parse_shard(shard)
+        if shard_by not in ('file', 'test'):
+            raise ValueError("shard_by must be 'file' or 'test', "
+                             "got '%s'" % shard_by)
+    if history is not None:
+        history = RunHistory(history)
+    if order is not None:
+        if order not in ORDERS:
+            raise ValueError("order must be one of %s, got '%s'" %
+                             (', '.join(ORDERS), order))
+        if history is None:
+            raise ValueError("ordering tests requires a history file")
 
     json_files = [f for f in os.listdir(tests_path) if f.endswith('.json')]
+
+    if shard is not None and shard_by == 'file':
+        durations = history.spec_durations() if history else {}
+        assignment = assign_shards(json_files, shard_count, durations)
+        json_files = [f for f in json_files
+                      if assignment[f] == shard_index]
+
+    test_classes = {}
     for json_file in json_files:
-        # Create a camelcased name for the test. This is a minor thing, but I
-        # think it's nice.
-        name, extension = os.path.splitext(json_file)
-        class_name = ''.join(x for x in name.title() if x not in ' _-') \
-                + 'TestCase'
+        class_name = spec_class_name(json_file)
 
-        # Get the full path to the file and create a test class
+        # Get the full path to the file and create a test class. Other
+        # JSON files, e.g. fixtures, are skipped.
         json_file_path = os.path.join(tests_path, json_file)
+        spec = read_spec(json_file_path)
+        if not is_spec(spec):
+            continue
         test_class = JSONSpecTestCaseFactory(class_name,
                                              super_class,
-                                             json_file_path)
-        # Add the test class to globals() so that unittest.main() picks it up
-        context[class_name] = test_class
+                                             json_file_path,
+                                             bounded_memory=bounded_memory,
+                                             index=index,
+                                             result_cache=result_cache,
+                                             spec=spec)
+        test_classes[class_name] = test_class
+
+    if shard is not None and shard_by == 'test':
+        # Remove the tests that belong to other shards
+        tests = {}
+        for test_class in test_classes.values():
+            for method_name in vars(test_class):
+                if method_name.startswith('test'):
+                    tests[spec_test_id(test_class.spec_file, method_name)] = \
+                        (test_class, method_name)
+        durations = history.durations() if history else {}
+        assignment = assign_shards(sorted(tests), shard_count, durations)
+        for test_id, (test_class, method_name) in tests.items():
+            if assignment[test_id] != shard_index:
+                delattr(test_class, method_name)
+
+    # Add the test classes to globals() so that unittest.main() picks them up
+    context.update(test_classes)
+
+    if order is not None:
+        def load_tests(loader, tests, pattern):
+            return unittest.TestSuite(history.order(iter_tests(tests), order))
+        context['load_tests'] = load_tests
+
+
+def JSONTestSuiteLoader(tests_path, super_class, **kwargs):
+    """
+    Load JSON specifications for macro test cases from the given
+    `tests_path` like `JSONTestCaseLoader()`, which is given any keyword
+    arguments, and return a `unittest.TestSuite` of their tests.
+    """
+    context = {}
+    JSONTestCaseLoader(tests_path, super_class, context, **kwargs)
+    load_tests = context.pop('load_tests', None)
+
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    for class_name in sorted(context):
+        suite.addTests(loader.loadTestsFromTestCase(context[class_name]))
+
+    if load_tests is not None:
+        suite = load_tests(loader, suite, None)
+    return suite
@@ -3,6 +3,9 @@
 import unittest
 import mock
 
+from .fixtures import contains_lazy, load_lazy
+from .streaming import StreamingResult
+
 
 class MacroTestCaseMixin(object):
     """
@@ -26,8 +29,29 @@ class MacroTestCaseMixin(object):
     This class is expected to be mixed in with `unittest.TestCase`.
     `MacroTestCase`, defined below, does this for you. It's split up
     for the purpose of testing the helper/utility methods defined below.
+
+    If `bounded_memory` is true the environment is released with
+    `release_environment()` after each test, so that test instances
+    held by `unittest` until the end of the run don't keep their
+    template environments, filters, context and mocks alive.
+
+    If `stream_render` is true, JSON spec tests render macros with
+    `render_macro_stream()` rather than `render_macro()`.
+
+    If `result_cache` is a `ResultCache`, JSON spec tests that passed
+    the last time they were run with the same spec and templates are
+    skipped as cached.
+
+    If `call_tracer` is a `CallTracer`, calls to filters added with
+    `add_filter()` and context functions mocked with
+    `mock_context_function()` are counted for each macro rendered.
     """
 
+    bounded_memory = False
+    stream_render = False
+    result_cache = None
+    call_tracer = None
+
     def setup_environment(self):
         """
         Setup the templating system's environment
@@ -41,6 +65,45 @@ class MacroTestCaseMixin(object):
         """
         raise NotImplementedError("please mixin an environment class")
 
+    def render_macro_string(self, macro_file, macro, *args, **kwargs):
+        """
+        Render a given macro with the given arguments and keyword
+        arguments. Returns the rendered string.
+        """
+        raise NotImplementedError("please mixin an environment class")
+
+    def macro_template(self, macro_file, macro, *args, **kwargs):
+        """
+        Build the template environment and return a template that calls
+        the given macro with the given arguments when it's rendered with
+        the test's context.
+        """
+        raise NotImplementedError("please mixin an environment class")
+
+    def render_macro_stream(self, macro_file, macro, *args, **kwargs):
+        """
+        Render a given macro with the given arguments and keyword
+        arguments as a stream. Returns a StreamingResult.
+        """
+        raise NotImplementedError("please mixin an environment class "
+                                  "that supports streaming")
+
+    def loaded_template_sources(self):
+        """
+        Return the sources of the templates loaded by the last render,
+        by name, not including mock templates.
+        """
+        raise NotImplementedError("please mixin an environment class "
+                                  "that records loaded templates")
+
+    def get_template_source(self, name):
+        """
+        Return the source of the template with the given name, or None
+        if there isn't one.
+        """
+        raise NotImplementedError("please mixin an environment class "
+                                  "that records loaded templates")
+
     def add_filter(self, name, filter):
         """
         Add the given filter to the template environment.
@@ -60,6 +123,13 @@ class MacroTestCaseMixin(object):
         """
         raise NotImplementedError("please mixin an environment class")
 
+    def release_environment(self):
+        """
+        Release the templating system's environment and anything added
+        to it for the test.
+        """
+        pass
+
     def search_root(self):
         """
         Return the root of the search path for templates.
@@ -78,6 +148,10 @@ class MacroTestCaseMixin(object):
     def setUp(self):
         self.setup_environment()
 
+    def tearDown(self):
+        if self.bounded_memory:
+            self.release_environment()
+
     def mock_filter(self, filter, *values):
         """
         Mock a template filter. This will create a mock function for the
@@ -90,12 +164,7 @@ class MacroTestCaseMixin(object):
 
         """
         mock_filter = mock.Mock()
-
-        if len(values) > 1:
-            mock_filter.side_effect = values
-        elif len(values) == 1:
-            mock_filter.return_value = values[0]
-
+        self.set_mock_values(mock_filter, values)
         self.add_filter(filter, mock_filter)
 
     def mock_context_function(self, func, *values):
@@ -110,14 +179,38 @@ class MacroTestCaseMixin(object):
             get_document
         """
         mock_func = mock.Mock()
+        self.set_mock_values(mock_func, values)
+        self.add_context(func,
+                         self.trace_calls('context function', func, mock_func))
+
+    def trace_calls(self, kind, name, func):
+        """
+        Return the given filter or context function, wrapped to count
+        its calls if there is a `call_tracer`.
+        """
+        if self.call_tracer is None:
+            return func
+        return self.call_tracer.wrap(kind, name, func)
 
-        if len(values) > 1:
+    def set_mock_values(self, mock_func, values):
+        """
+        Set the given mock to return either a single value or each of
+        the given values in turn if there are more than one. Lazy
+        fixtures, anywhere in a value, are only loaded when the mock is
+        called.
+        """
+        if any(contains_lazy(v) for v in values):
+            remaining = iter(values)
+
+            def side_effect(*args, **kwargs):
+                value = values[0] if len(values) == 1 else next(remaining)
+                return load_lazy(value)
+            mock_func.side_effect = side_effect
+        elif len(values) > 1:
             mock_func.side_effect = values
         elif len(values) == 1:
             mock_func.return_value = values[0]
 
-        self.add_context(func, mock_func)
-
     def mock_template_macro(self, name, macro_name, contents):
         """
         Mock calls to a macro in another template.
@@ -138,6 +231,13 @@ class MacroTestCaseMixin(object):
         the entire match.
         """
 
+        # Streaming results can tell whether an element exists without
+        # rendering and parsing the whole document.
+        if assertion == 'exists' and not attribute and \
+                isinstance(result, StreamingResult):
+            assert result.exists(selector, index)
+            return
+
         selection = result.select(selector)
 
         # Get the value we're making assertions about. It's either the
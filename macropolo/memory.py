@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+# tracemalloc is only available on Python 3.4+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def spec_file_for_test(test):
+    """
+    Return the JSON spec file the given test was created from, or the
+    name of its class for tests that weren't created from a spec.
+    """
+    return getattr(test, 'spec_file', None) or type(test).__name__
+
+
+class MemoryTracingResult(unittest.TextTestResult):
+    """
+    A `unittest` result class that traces memory allocations with
+    `tracemalloc` while each test runs, and records the peak memory
+    allocated by any one test for each JSON spec file in `self.peaks`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MemoryTracingResult, self).__init__(*args, **kwargs)
+        if tracemalloc is None:
+            raise RuntimeError("memory tracing requires tracemalloc")
+        self.peaks = {}
+
+    def startTest(self, test):
+        super(MemoryTracingResult, self).startTest(test)
+        # Restart tracing rather than resetting the peak where
+        # tracemalloc.reset_peak() isn't available (before Python 3.9).
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.stop()
+            tracemalloc.start()
+        self._start_memory = tracemalloc.get_traced_memory()[0]
+
+    def stopTest(self, test):
+        current, peak = tracemalloc.get_traced_memory()
+        spec_file = spec_file_for_test(test)
+        self.peaks[spec_file] = max(self.peaks.get(spec_file, 0),
+                                    peak - self._start_memory)
+        super(MemoryTracingResult, self).stopTest(test)
+
+    def stopTestRun(self):
+        tracemalloc.stop()
+        super(MemoryTracingResult, self).stopTestRun()
+
+
+def format_memory_report(peaks):
+    """
+    Format the peak memory per spec file recorded by a
+    `MemoryTracingResult`, largest first.
+    """
+    lines = ['Peak memory per spec file:']
+    for spec_file, peak in sorted(peaks.items(), key=lambda p: -p[1]):
+        lines.append('  {:>10.1f} KiB  {}'.format(peak / 1024.0, spec_file))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+
+import re
+import unittest
+import multiprocessing
+
+from jinja2 import Environment, TemplateSyntaxError
+
+from .history import record_id, iter_tests
+from .index import TemplateReferences
+from .jsonspec import JSONTestSuiteLoader
+
+
+# Jinja2 block tags, e.g. {% if x %}, with their name and arguments.
+TAG_RE = re.compile(r'\{%-?\s*(\w+)(.*?)-?%\}', re.S)
+
+# Jinja2 tags of any kind.
+JINJA_RE = re.compile(r'\{%.*?%\}|\{\{.*?\}\}|\{#.*?#\}', re.S)
+
+# Quoted attributes of HTML tags, with their leading whitespace.
+ATTRIBUTE_RE = re.compile(r'''\s+[a-zA-Z_:][\w:.-]*=(?:"[^"]*"|'[^']*')''')
+
+# Filters applied in Jinja2 expressions, e.g. "|upper".
+FILTER_RE = re.compile(r'\|\s*(\w+)')
+
+# Built-in filters swapped for a filter with a similar signature but a
+# different result. Other filters are swapped for another filter used in
+# the same template.
+FILTER_SWAPS = {
+    'upper': 'lower', 'lower': 'upper', 'title': 'lower',
+    'capitalize': 'lower', 'first': 'last', 'last': 'first',
+    'safe': 'escape', 'escape': 'safe', 'e': 'safe',
+    'sort': 'reverse', 'reverse': 'sort',
+}
+
+OPERATORS = ('flip-condition', 'drop-attribute', 'swap-filter',
+             'remove-loop-body')
+
+
+class Mutant(object):
+    """
+    A copy of a template's `source` with a single mutation, made by the
+    given `operator` in the given `macro` at line `lineno`.
+    """
+
+    def __init__(self, template, macro, operator, lineno, description,
+                 source):
+        self.template = template
+        self.macro = macro
+        self.operator = operator
+        self.lineno = lineno
+        self.description = description
+        self.source = source
+
+    def __repr__(self):
+        return '<Mutant {}>'.format(self)
+
+    def __str__(self):
+        return '{}:{}: {} in {}: {}'.format(self.template, self.lineno,
+                                            self.operator, self.macro,
+                                            self.description)
+
+
+def macro_spans(source):
+    """
+    Return a dict of the (start, end) offsets of the body of each macro
+    in the given template source, by macro name.
+    """
+    spans = {}
+    stack = []
+    for tag in TAG_RE.finditer(source):
+        if tag.group(1) == 'macro':
+            stack.append((tag.group(2).split('(')[0].strip(), tag.end()))
+        elif tag.group(1) == 'endmacro' and stack:
+            name, start = stack.pop()
+            spans[name] = (start, tag.start())
+    return spans
+
+
+def macro_calls(source, spans):
+    """
+    Return a dict of the names of the macros each macro in the given
+    template source calls directly, by macro name, given the spans of
+    their bodies from `macro_spans()`.
+    """
+    calls = {}
+    for name, (start, end) in spans.items():
+        calls[name] = set(
+            other for other in spans if other != name and
+            re.search(r'\b{}\s*\('.format(re.escape(other)),
+                      source[start:end]))
+    return calls
+
+
+def calling_macros(macro, calls):
+    """
+    Return the names of the given macro and of every macro that calls
+    it, directly or through other macros, in the given call graph from
+    `macro_calls()`.
+    """
+    callers = set([macro])
+    pending = [macro]
+    while pending:
+        callee = pending.pop()
+        for name, called in calls.items():
+            if callee in called and name not in callers:
+                callers.add(name)
+                pending.append(name)
+    return callers
+
+
+def condition_sites(source):
+    for tag in TAG_RE.finditer(source):
+        if tag.group(1) in ('if', 'elif'):
+            condition = tag.group(2).strip()
+            yield (tag.start(2), tag.end(2), ' not ({}) '.format(condition),
+                   '{} {} -> {} not ({})'.format(tag.group(1), condition,
+                                                 tag.group(1), condition))
+
+
+def loop_body_sites(source):
+    # Match for and if blocks, so that the else of a for loop is found.
+    stack = []
+    for tag in TAG_RE.finditer(source):
+        name = tag.group(1)
+        if name in ('for', 'if'):
+            stack.append([name, tag.end(), None, tag.group(2).strip()])
+        elif name == 'else' and stack and stack[-1][0] == 'for':
+            stack[-1][2] = tag.start()
+        elif name in ('endfor', 'endif') and stack:
+            block, start, end, loop = stack.pop()
+            if block == 'for':
+                end = end if end is not None else tag.start()
+                if source[start:end].strip():
+                    yield (start, end, '',
+                           'remove body of for {}'.format(loop))
+
+
+def inside(position, spans):
+    return any(start < position < end for start, end in spans)
+
+
+def attribute_sites(source):
+    jinja_spans = [m.span() for m in JINJA_RE.finditer(source)]
+    for attribute in ATTRIBUTE_RE.finditer(source):
+        start, end = attribute.span()
+        # Skip matches within Jinja2 tags, and text outside HTML tags.
+        if inside(start, jinja_spans) or inside(end, jinja_spans):
+            continue
+        if source.rfind('<', 0, start) <= source.rfind('>', 0, start):
+            continue
+        yield (start, end, '',
+               'drop attribute {}'.format(attribute.group().strip()))
+
+
+def filter_sites(source):
+    expressions = [m for m in JINJA_RE.finditer(source)
+                   if not m.group().startswith('{#')]
+    used = sorted(set(f.group(1) for m in expressions
+                      for f in FILTER_RE.finditer(m.group())))
+    for m in expressions:
+        for f in FILTER_RE.finditer(m.group()):
+            name = f.group(1)
+            replacement = FILTER_SWAPS.get(name)
+            if replacement is None:
+                others = [u for u in used if u != name]
+                if not others:
+                    continue
+                replacement = others[0]
+            yield (m.start() + f.start(1), m.start() + f.end(1),
+                   replacement, '|{} -> |{}'.format(name, replacement))
+
+
+SITES = {
+    'flip-condition': condition_sites,
+    'drop-attribute': attribute_sites,
+    'swap-filter': filter_sites,
+    'remove-loop-body': loop_body_sites,
+}
+
+
+def find_mutants(template, source, operators=OPERATORS):
+    """
+    Return the mutants of the macros in the given template source that
+    the given mutation operators make. Mutants that aren't valid
+    templates are left out.
+    """
+    spans = macro_spans(source)
+    env = Environment()
+    mutants = []
+    for operator in operators:
+        for start, end, replacement, description in SITES[operator](source):
+            # Attribute the mutation to the innermost macro containing it.
+            macros = [(s, name) for name, (s, e) in spans.items()
+                      if s <= start and end <= e]
+            if not macros:
+                continue
+            macro = max(macros)[1]
+
+            mutated = source[:start] + replacement + source[end:]
+            try:
+                env.parse(mutated)
+            except TemplateSyntaxError:
+                continue
+            mutants.append(Mutant(template, macro, operator,
+                                  source.count('\n', 0, start) + 1,
+                                  description, mutated))
+    return mutants
+
+
+# The base test case class and the spec tests of a worker process, by
+# spec test id.
+worker_super_class = None
+worker_tests = {}
+
+
+def init_worker(tests_path, super_class):
+    """
+    Load the spec tests in a worker process.
+    """
+    global worker_super_class
+    worker_super_class = super_class
+    suite = JSONTestSuiteLoader(tests_path, super_class)
+    worker_tests.clear()
+    worker_tests.update((record_id(t), t) for t in iter_tests(suite))
+
+
+def run_mutant(task):
+    """
+    Run the given tests against the given mutant in a worker process,
+    and return the mutant's index and the id of the first test that
+    killed it, or None if it survived.
+    """
+    index, mutant, test_ids = task
+    worker_super_class.template_overrides = {mutant.template: mutant.source}
+    try:
+        for test_id in test_ids:
+            result = unittest.TestResult()
+            worker_tests[test_id](result)
+            if result.failures or result.errors:
+                return index, test_id
+        return index, None
+    finally:
+        worker_super_class.template_overrides = None
+
+
+class MutationTester(object):
+    """
+    Mutation testing for the macros tested by the JSON specs in
+    `tests_path`: each macro is mutated, e.g. by flipping a condition,
+    and the spec tests that would render the mutated macro are rerun.
+    A mutant is killed if any of them fails, and survives if all of them
+    pass, which suggests the specs don't check what the mutated code
+    does.
+
+    Mutated templates are loaded through the `template_overrides` of
+    `Jinja2Environment`, so no files are changed. Mutants are run in
+    `processes` worker processes (by default one per CPU), each with
+    its own warm bytecode cache, so that only the mutated template is
+    compiled for each test. `super_class` must be importable by worker
+    processes, i.e. defined at the top level of a module.
+    """
+
+    def __init__(self, tests_path, super_class, processes=None,
+                 operators=OPERATORS, templates=None):
+        self.tests_path = tests_path
+        self.super_class = super_class
+        self.processes = processes or multiprocessing.cpu_count()
+        self.operators = operators
+        self.templates = templates
+
+        probe = super_class()
+        probe.setup_environment()
+        self.references = TemplateReferences(probe.search_paths)
+
+    def passing_tests(self):
+        """
+        Return a dict of the macro file and macro name of each spec test
+        that passes without mutations, by spec test id.
+        """
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class)
+        tests = {}
+        for test in iter_tests(suite):
+            method = getattr(type(test), test._testMethodName, None)
+            if not hasattr(method, 'macro_file'):
+                continue
+            result = unittest.TestResult()
+            test(result)
+            if result.wasSuccessful() and not result.skipped:
+                tests[record_id(test)] = (method.macro_file,
+                                          method.macro_name)
+        return tests
+
+    def source(self, template):
+        env = self.references.env
+        return env.loader.get_source(env, template)[0]
+
+    def mutants(self, tests):
+        """
+        Return the mutants of the templates the given tests depend on.
+        """
+        templates = set()
+        for macro_file, macro_name in tests.values():
+            templates.update(self.references.dependencies(macro_file))
+        if self.templates is not None:
+            templates &= set(self.templates)
+
+        mutants = []
+        for template in sorted(templates):
+            try:
+                source = self.source(template)
+            except Exception:
+                continue
+            mutants.extend(find_mutants(template, source, self.operators))
+        return mutants
+
+    def tests_for(self, mutant, tests):
+        """
+        Return the ids of the given tests that render the mutated macro:
+        tests of the macro itself or of a macro in the same template
+        that calls it, directly or through other macros, and tests of
+        templates that depend on the mutated template.
+        """
+        spans = macro_spans(mutant.source)
+        callers = calling_macros(mutant.macro,
+                                 macro_calls(mutant.source, spans))
+        test_ids = []
+        for test_id, (macro_file, macro_name) in sorted(tests.items()):
+            if macro_file == mutant.template:
+                if macro_name not in callers:
+                    continue
+            elif mutant.template not in \
+                    self.references.dependencies(macro_file):
+                continue
+            test_ids.append(test_id)
+        return test_ids
+
+    def run(self):
+        """
+        Run every mutant and return a list of (mutant, status, test id)
+        tuples, where status is 'killed', with the id of the test that
+        killed it, 'survived', or 'uncovered' if no test renders it.
+        """
+        tests = self.passing_tests()
+        mutants = self.mutants(tests)
+        results = [None] * len(mutants)
+
+        tasks = []
+        for index, mutant in enumerate(mutants):
+            test_ids = self.tests_for(mutant, tests)
+            if test_ids:
+                tasks.append((index, mutant, test_ids))
+            else:
+                results[index] = (mutant, 'uncovered', None)
+
+        if self.processes > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(
+                self.processes, initializer=init_worker,
+                initargs=(self.tests_path, self.super_class))
+            try:
+                # Mutants are sorted by template, so chunks of them share
+                # compiled templates.
+                chunksize = max(1, len(tasks) // (self.processes * 4))
+                outcomes = list(pool.imap_unordered(run_mutant, tasks,
+                                                    chunksize))
+            finally:
+                pool.terminate()
+        else:
+            init_worker(self.tests_path, self.super_class)
+            outcomes = [run_mutant(task) for task in tasks]
+
+        for index, test_id in outcomes:
+            status = 'survived' if test_id is None else 'killed'
+            results[index] = (mutants[index], status, test_id)
+        return results
+
+
+def mutation_score(results):
+    """
+    Return the fraction of the given mutants that were killed.
+    """
+    if not results:
+        return 1.0
+    killed = sum(1 for mutant, status, test_id in results
+                 if status == 'killed')
+    return float(killed) / len(results)
+
+
+def format_mutation_report(results):
+    """
+    Format a report of the mutants that survived or weren't covered by
+    any test, and the mutation score.
+    """
+    lines = []
+    for status in ('survived', 'uncovered'):
+        mutants = [m for m, s, t in results if s == status]
+        if mutants:
+            lines.append('{} mutants:'.format(status.capitalize()))
+            lines.extend('  {}'.format(m) for m in mutants)
+    killed = sum(1 for m, s, t in results if s == 'killed')
+    lines.append('Mutation score: {:.1%} ({} of {} mutants killed)'.format(
+        mutation_score(results), killed, len(results)))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+
+import jinja2
+
+from . import __version__
+
+
+# The reason tests whose inputs haven't changed are skipped with.
+CACHED = 'cached'
+
+
+def hash_text(text):
+    if not isinstance(text, bytes):
+        text = text.encode('utf-8')
+    return hashlib.sha1(text).hexdigest()
+
+
+def versions():
+    """
+    Return the versions of the packages whose changes invalidate all
+    cached results.
+    """
+    return {'macropolo': __version__, 'jinja2': jinja2.__version__}
+
+
+def referenced_files(value):
+    """
+    Return the paths of the fixture files referred to with `$ref` or
+    `$lazy` in the given JSON value from a spec, relative to the spec.
+    """
+    files = set()
+    if isinstance(value, dict):
+        if isinstance(value.get('$ref'), str):
+            files.add(value['$ref'].partition('#')[0])
+        if isinstance(value.get('$lazy'), str):
+            files.add(value['$lazy'].partition('#')[0])
+        for v in value.values():
+            files.update(referenced_files(v))
+    elif isinstance(value, list):
+        for v in value:
+            files.update(referenced_files(v))
+    files.discard('')
+    return files
+
+
+def spec_inputs(test_dict, spec, json_file):
+    """
+    Return a hash of the given test from the given JSON spec, along with
+    the spec's macro file and its named fixtures, and the paths of the
+    fixture files either refers to. The fixture files aren't read.
+    """
+    inputs = [spec['file'], spec.get('fixtures', {}), test_dict]
+    digest = hash_text(json.dumps(inputs, sort_keys=True))
+    files = sorted(os.path.join(os.path.dirname(json_file), path)
+                   for path in referenced_files(inputs))
+    return digest, files
+
+
+class ResultCache(object):
+    """
+    The inputs of each JSON spec test that passed, persisted as JSON in
+    the file at `path`: a hash of the test's spec and the fixture files it
+    refers to (see `spec_hash()`), and of the source of each template it
+    loaded from the search paths.
+
+    A test whose spec and templates are unchanged since it last passed
+    is cached and can be skipped, unless `force` is true. All cached
+    results are discarded when the macropolo or Jinja2 version changes.
+    Anything else the test depends on, e.g. filters defined in Python,
+    isn't tracked; use `force` after changing it.
+    """
+
+    def __init__(self, path, force=False):
+        self.path = path
+        self.force = force
+        self.versions = versions()
+        self.tests = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                cached = json.load(f)
+            if cached.get('versions') == self.versions:
+                self.tests = cached.get('tests', {})
+
+        # Template source hashes by name. Templates aren't expected to
+        # change during a run.
+        self.source_hashes = {}
+
+        # Fixture file hashes by (path, mtime, size), so that a fixture
+        # file shared by many tests is only read once.
+        self.file_hashes = {}
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'versions': self.versions, 'tests': self.tests}, f,
+                      indent=1, sort_keys=True)
+
+    def file_hash(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (path, stat.st_mtime, stat.st_size)
+        if key not in self.file_hashes:
+            with open(path, 'rb') as f:
+                self.file_hashes[key] = hash_text(f.read())
+        return self.file_hashes[key]
+
+    def spec_hash(self, spec_inputs):
+        """
+        Return the hash of a test's spec from its `spec_inputs()`,
+        including the current contents of the fixture files it refers
+        to.
+        """
+        # The refs to the files are part of the digest, so the hashes are
+        # the same wherever the specs are checked out.
+        digest, files = spec_inputs
+        for path in files:
+            digest += '|{}'.format(self.file_hash(path))
+        return hash_text(digest)
+
+    def source_hash(self, name, get_source):
+        if name not in self.source_hashes:
+            source = get_source(name)
+            self.source_hashes[name] = \
+                None if source is None else hash_text(source)
+        return self.source_hashes[name]
+
+    def is_cached(self, test_id, spec_hash, get_source):
+        """
+        Return whether the test with the given id and spec hash passed
+        the last time it was run with the same template sources.
+        `get_source` is called with the name of each template the test
+        loaded and returns its current source, or None if it no longer
+        exists.
+        """
+        if self.force:
+            return False
+        cached = self.tests.get(test_id)
+        if cached is None or cached['spec'] != spec_hash:
+            return False
+        return all(self.source_hash(name, get_source) == digest
+                   for name, digest in cached['templates'].items())
+
+    def record(self, test_id, spec_hash, sources):
+        """
+        Record that the test with the given id and spec hash passed
+        after loading the given template sources, by name.
+        """
+        templates = {}
+        for name, source in sources.items():
+            templates[name] = self.source_hashes[name] = hash_text(source)
+        self.tests[test_id] = {'spec': spec_hash, 'templates': templates}
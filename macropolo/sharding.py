@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+
+
+def parse_shard(shard):
+    """
+    Parse a shard given as 'i/N', i.e. the i-th of N shards counting
+    from 1, and return (i, N).
+    """
+    try:
+        index, count = [int(x) for x in shard.split('/')]
+    except ValueError:
+        raise ValueError("shard must be given as 'i/N', got '%s'" % shard)
+    if not 1 <= index <= count:
+        raise ValueError("shard '%s' is out of range" % shard)
+    return index, count
+
+
+def hash_shard(item, count):
+    """
+    Return the shard from 1 to `count` for the given item, by a hash
+    that is stable across processes and machines.
+    """
+    # crc32 is signed on Python 2, so make it unsigned as on Python 3.
+    return (zlib.crc32(item.encode('utf-8')) & 0xffffffff) % count + 1
+
+
+def assign_shards(items, count, durations):
+    """
+    Deterministically assign each of the given items (spec files or spec
+    test ids) to one of `count` shards, numbered from 1, and return a
+    dict of the shard for each item.
+
+    Items with a recorded duration in `durations` are assigned longest
+    first to the shard with the least total duration so far, balancing
+    wall-clock time. Items with no recorded duration, e.g. new specs,
+    are assigned by hash.
+    """
+    loads = [0.0] * count
+    assignment = {}
+
+    known = sorted((i for i in items if i in durations),
+                   key=lambda i: (-durations[i], i))
+    for item in known:
+        shard = min(range(count), key=lambda s: (loads[s], s))
+        loads[shard] += durations[item]
+        assignment[item] = shard + 1
+
+    for item in items:
+        if item not in assignment:
+            assignment[item] = hash_shard(item, count)
+
+    return assignment
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+try:
+    from html.parser import HTMLParser
+except ImportError:
+    from HTMLParser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+
+# A compound selector of an optional tag name followed by any number of
+# classes, ids and [attribute] or [attribute=value] selectors.
+SELECTOR_PART = r'([.#])([\w-]+)|\[([\w-]+)(?:=("[^"]*"|\'[^\']*\'|[^\]]*))?\]'
+SELECTOR_PART_RE = re.compile(SELECTOR_PART)
+SIMPLE_SELECTOR_RE = re.compile(
+    r'^(?P<tag>[a-zA-Z][\w-]*|\*)?(?P<parts>(?:' + SELECTOR_PART + r')*)$')
+
+
+def simple_selector(selector):
+    """
+    Return a function that matches a start tag's name and attributes
+    against the given CSS selector, or None if the selector is more
+    complex than a single compound selector, e.g. 'a.button[href]'.
+    """
+    match = SIMPLE_SELECTOR_RE.match(selector.strip())
+    if match is None or not selector.strip():
+        return None
+
+    tag = match.group('tag')
+    tests = []
+    for prefix, name, attr, value in \
+            SELECTOR_PART_RE.findall(match.group('parts')):
+        if prefix == '.':
+            tests.append(lambda a, n=name: n in a.get('class', '').split())
+        elif prefix == '#':
+            tests.append(lambda a, n=name: a.get('id') == n)
+        elif value:
+            tests.append(lambda a, n=attr, v=value.strip('"\''):
+                         a.get(n) == v)
+        else:
+            tests.append(lambda a, n=attr: n in a)
+
+    def matches(start_tag, attrs):
+        if tag not in (None, '*') and start_tag != tag.lower():
+            return False
+        attrs = dict((k, v or '') for k, v in attrs)
+        return all(test(attrs) for test in tests)
+
+    return matches
+
+
+class StartTagParser(HTMLParser):
+    """
+    An incremental HTML parser that only keeps the start tags it has
+    seen, with their attributes.
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.start_tags = []
+
+    def handle_starttag(self, tag, attrs):
+        self.start_tags.append((tag, attrs))
+
+
+class StreamingResult(object):
+    """
+    The result of rendering a macro as a stream of chunks, e.g. from
+    Jinja2's `Template.generate()`.
+
+    Chunks are rendered and parsed as they are needed: `exists()` stops
+    as soon as the selected element has been seen for simple selectors.
+    Jinja2 buffers the output of each macro call, though, so the first
+    chunk is usually the whole rendered macro; large chunks are parsed
+    `chunk_size` characters at a time so `exists()` can still stop
+    early. `select()` needs the whole document and builds the rest of it
+    into a BeautifulSoup object like `render_macro()` returns.
+    """
+
+    def __init__(self, chunks, chunk_size=65536):
+        self.chunks = iter(chunks)
+        self.chunk_size = chunk_size
+        # The chunks rendered so far, kept as they are for select(), and
+        # how much of the last one has been parsed.
+        self.rendered = []
+        self.parsed = 0
+        self.parser = StartTagParser()
+        self.finished = False
+        self.soup = None
+
+    def feed(self):
+        """
+        Parse the next `chunk_size` characters, rendering the next chunk
+        if needed. Returns False if there are no more chunks.
+        """
+        if self.finished:
+            return False
+        if not self.rendered or self.parsed >= len(self.rendered[-1]):
+            try:
+                self.rendered.append(next(self.chunks))
+            except StopIteration:
+                self.finished = True
+                self.parser.close()
+                return False
+            self.parsed = 0
+        chunk = self.rendered[-1]
+        self.parser.feed(chunk[self.parsed:self.parsed + self.chunk_size])
+        self.parsed += self.chunk_size
+        return True
+
+    def exists(self, selector, index=0):
+        """
+        Return whether there are more than `index` elements matching the
+        given CSS selector, rendering no more than needed to tell.
+        """
+        matches = simple_selector(selector)
+        if matches is None:
+            return len(self.select(selector)) > index
+
+        found = 0
+        checked = 0
+        while True:
+            start_tags = self.parser.start_tags
+            for tag, attrs in start_tags[checked:]:
+                if matches(tag, attrs):
+                    found += 1
+                    if found > index:
+                        return True
+            checked = len(start_tags)
+            if not self.feed():
+                return False
+
+    def select(self, selector):
+        """
+        Render the rest of the document and return the elements that
+        match the given CSS selector.
+        """
+        if self.soup is None:
+            # Render the rest of the document without parsing it again.
+            self.rendered.extend(self.chunks)
+            self.finished = True
+            self.parser = StartTagParser()
+            self.soup = BeautifulSoup(u''.join(self.rendered), "html.parser")
+            self.rendered = []
+        return self.soup.select(selector)
+
+    def decompose(self):
+        """
+        Stop rendering and release the rendered document.
+        """
+        close = getattr(self.chunks, 'close', None)
+        if close is not None:
+            close()
+        self.finished = True
+        self.rendered = []
+        self.parser = StartTagParser()
+        if self.soup is not None:
+            self.soup.decompose()
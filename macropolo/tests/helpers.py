@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from macropolo import MacroTestCase
+from macropolo.environments import Jinja2Environment
+
+
+def template_test_case(templates_path):
+    """
+    Return a base test case class that loads templates from the given
+    path.
+    """
+    class TemplateTestCase(Jinja2Environment, MacroTestCase):
+        def search_root(self):
+            return templates_path
+
+        def search_exceptions(self):
+            return []
+
+    return TemplateTestCase
+
+
+class SpecProjectTestCase(unittest.TestCase):
+    """
+    A test case with a temporary project directory, `root`, with
+    `templates` and `specs` subdirectories, and a base test case class,
+    `super_class`, that loads templates from it.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.templates_path = os.path.join(self.root, 'templates')
+        self.tests_path = os.path.join(self.root, 'specs')
+        os.mkdir(self.templates_path)
+        os.mkdir(self.tests_path)
+        self.super_class = template_test_case(self.templates_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, directory, name, contents):
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(contents)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+from macropolo import JSONTestSuiteLoader
+from macropolo.bench import bench_suite, compare, mann_whitney_p, percentile
+from macropolo.tests.helpers import SpecProjectTestCase
+
+
+class BenchTestCase(SpecProjectTestCase):
+    """
+    Tests for benchmarking JSON spec macros
+    """
+
+    def setUp(self):
+        super(BenchTestCase, self).setUp()
+
+        self.write(self.templates_path, 'list.html', """
+            {% macro list() %}
+              <ul>{% for i in items() %}<li>{{ i|shout }}</li>{% endfor %}</ul>
+            {% endmacro %}
+        """)
+        self.write(self.tests_path, 'list.json', json.dumps({
+            'file': 'list.html',
+            'tests': [{'macro_name': 'list',
+                       'mock_context_functions': {'items': [[1, 2]]},
+                       'mock_filters': {'shout': ['A', 'B']},
+                       'assertions': [{'selector': 'li'}]},
+                      {'macro_name': 'missing',
+                       'assertions': [{'selector': 'li'}]},
+                      {'macro_name': 'list',
+                       'skip': True,
+                       'assertions': [{'selector': 'li'}]}]
+        }))
+
+    def test_bench_suite(self):
+        """
+        Each macro is rendered with fresh mocks every iteration, and
+        errors are reported without stopping the benchmark.
+        """
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class)
+        results, errors = bench_suite(suite, repeat=3, warmup=2)
+
+        self.assertEqual(list(results), ['list.json::test_0list'])
+        result = results['list.json::test_0list']
+        self.assertEqual(result['macro'], 'list.html:list')
+        self.assertEqual(len(result['samples']), 3)
+        self.assertTrue(result['size'] > 0)
+        self.assertEqual(list(errors), ['list.json::test_1missing'])
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([3], 90), 3)
+
+    def test_compare(self):
+        """
+        Only significant slowdowns beyond the threshold are regressions.
+        """
+        old = [1.0 + i * 0.001 for i in range(30)]
+        slower = [x * 1.2 for x in old]
+        noisy = [x * 1.01 for x in old]
+        self.assertTrue(mann_whitney_p(slower, old) < 0.01)
+        self.assertTrue(mann_whitney_p(old, slower) > 0.99)
+
+        baseline = {'a': {'samples': old}, 'b': {'samples': old},
+                    'c': {'samples': old}}
+        results = {'a': {'samples': slower}, 'b': {'samples': noisy},
+                   'c': {'samples': old}, 'new': {'samples': slower}}
+        self.assertEqual(compare(results, baseline), ['a'])
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import mock
+
+from macropolo.environments.filters import FilterRegistry, MemoizedFilter
+
+
+class FilterRegistryTestCase(unittest.TestCase):
+    """
+    Tests for the shared, memoizing filter registry
+    """
+
+    def test_pure_filters_are_memoized(self):
+        """
+        Pure filters are only called once for the same arguments.
+        """
+        registry = FilterRegistry()
+        upper = mock.Mock(side_effect=lambda s: s.upper())
+        registry.register('upper', upper, pure=True)
+
+        f = registry.filters['upper']
+        self.assertEqual(f('a'), 'A')
+        self.assertEqual(f('a'), 'A')
+        self.assertEqual(f('b'), 'B')
+        self.assertEqual(upper.call_count, 2)
+        self.assertAlmostEqual(registry.hit_rate(), 1 / 3.0)
+
+    def test_impure_filters_are_not_memoized(self):
+        """
+        Filters not registered as pure are registered as-is.
+        """
+        registry = FilterRegistry()
+        upper = mock.Mock()
+        registry.register('upper', upper)
+        self.assertIs(registry.filters['upper'], upper)
+
+    def test_lru_eviction(self):
+        """
+        The least recently used result is evicted when the cache is
+        full.
+        """
+        f = MemoizedFilter(lambda s, suffix='': s + suffix, maxsize=2)
+        f('a')
+        f('b')
+        f('a')
+        f('c')
+        self.assertEqual(list(f.cache), [('a',), ('c',)])
+
+        # Keyword arguments are part of the key
+        self.assertEqual(f('a', suffix='!'), 'a!')
+        self.assertEqual(f.hits, 1)
+
+    def test_unhashable_arguments(self):
+        """
+        Calls with unhashable arguments are passed straight through.
+        """
+        f = MemoizedFilter(len)
+        self.assertEqual(f([1, 2]), 2)
+        self.assertEqual(f([1, 2]), 2)
+        self.assertEqual(f.hits, 0)
+        self.assertEqual(len(f.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import mock
+
+from macropolo import MacroTestCaseMixin
+from macropolo.fixtures import freeze, resolve_refs, spec_fixtures
+from macropolo.fixtures import LazyFixture, load_lazy
+from macropolo.jsonspec import prepare_spec_test
+
+
+class FixturesTestCase(unittest.TestCase):
+    """
+    Tests for shared, read-only JSON spec fixtures
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.json_file = os.path.join(self.root, 'spec.json')
+        with open(os.path.join(self.root, 'results.json'), 'w') as f:
+            json.dump({'hits': [{'title': 'One'}, {'title': 'Two'}]}, f)
+        with open(os.path.join(self.root, 'results.ndjson'), 'w') as f:
+            f.write('{"title": "One"}\n{"title": "Two"}\n'
+                    '{"title": "Three"}\nnot json\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_freeze(self):
+        """
+        Frozen fixtures can't be modified.
+        """
+        fixture = freeze({'a': [1, {'b': 2}]})
+        with self.assertRaises(TypeError):
+            fixture['a'] = 1
+        with self.assertRaises(TypeError):
+            fixture['a'].append(3)
+        with self.assertRaises(TypeError):
+            fixture['a'][1].update({'b': 3})
+        self.assertEqual(fixture, {'a': [1, {'b': 2}]})
+
+    def test_named_fixture_refs_are_shared(self):
+        """
+        Refs to a named fixture resolve to the same frozen object.
+        """
+        spec = {'fixtures': {'doc': {'title': 'A', 'body': ['x']}}}
+        fixtures = spec_fixtures(spec, self.json_file)
+        ref = {'$ref': '#/fixtures/doc'}
+        first = resolve_refs({'context': {'doc': ref}}, self.json_file,
+                             fixtures)
+        second = resolve_refs([ref], self.json_file, fixtures)
+        self.assertIs(first['context']['doc'], second[0])
+
+    def test_file_refs_are_loaded_once(self):
+        """
+        Refs to a fixture file, with a pointer, load the file once.
+        """
+        ref = {'$ref': 'results.json#/hits/1'}
+        first = resolve_refs(ref, self.json_file)
+        second = resolve_refs(ref, self.json_file)
+        self.assertEqual(first, {'title': 'Two'})
+        self.assertIs(first, second)
+
+    def test_overrides_copy_on_write(self):
+        """
+        Overridden values are applied to a shallow copy of the fixture.
+        """
+        spec = {'fixtures': {'doc': {'title': 'A', 'body': ['x']}}}
+        fixtures = spec_fixtures(spec, self.json_file)
+        doc = resolve_refs({'$ref': '#/fixtures/doc', 'title': 'B'},
+                           self.json_file, fixtures)
+        self.assertEqual(doc, {'title': 'B', 'body': ['x']})
+        self.assertEqual(fixtures['doc']['title'], 'A')
+        self.assertIs(doc['body'], fixtures['doc']['body'])
+
+    def test_lazy_fixture_slice(self):
+        """
+        Lazy fixtures decode only the records in their slice.
+        """
+        lazy = resolve_refs({'$lazy': 'results.ndjson', '$slice': [1, 3]},
+                            self.json_file)
+        self.assertIsInstance(lazy, LazyFixture)
+        self.assertFalse(lazy.loaded)
+        self.assertEqual(lazy.load(), [{'title': 'Two'}, {'title': 'Three'}])
+
+        lazy = resolve_refs({'$lazy': 'results.json#/hits', '$slice': 1},
+                            self.json_file)
+        self.assertEqual(lazy.load(), [{'title': 'One'}])
+
+    def test_lazy_fixture_shared(self):
+        """
+        Lazy fixtures of the same file and slice share one decoded value.
+        """
+        ref = {'$lazy': 'results.ndjson', '$slice': 2}
+        first = resolve_refs(ref, self.json_file)
+        second = resolve_refs(ref, self.json_file)
+        self.assertIsNot(first, second)
+        self.assertIs(first.load(), second.load())
+        self.assertTrue(second.loaded)
+
+    def test_lazy_fixture_mock(self):
+        """
+        Lazy fixtures are loaded when a mock returning them is called.
+        """
+        test_case = MacroTestCaseMixin()
+        test_case.add_context = mock.MagicMock(name='add_context')
+        lazy = LazyFixture(os.path.join(self.root, 'results.ndjson'),
+                           stop=1)
+        test_case.mock_context_function('queries', lazy)
+        self.assertFalse(lazy.loaded)
+
+        queries = test_case.add_context.call_args[0][1]
+        self.assertEqual(queries(), [{'title': 'One'}])
+        self.assertEqual(queries(), [{'title': 'One'}])
+
+    def test_lazy_fixture_nested(self):
+        """
+        Lazy fixtures within mock values are loaded when the mock is
+        called, and in the context and arguments when the test runs.
+        """
+        test_case = MacroTestCaseMixin()
+        test_case.add_context = mock.MagicMock(name='add_context')
+        test_dict = resolve_refs({
+            'context': {'ctx': {'$lazy': 'results.json#/hits'}},
+            'arguments': [{'hits': {'$lazy': 'results.ndjson',
+                                    '$slice': 1}}],
+        }, self.json_file)
+        test_case.mock_context_function('queries', test_dict['arguments'][0])
+        queries = test_case.add_context.call_args[0][1]
+        self.assertEqual(queries(), {'hits': [{'title': 'One'}]})
+
+        args, kwargs = prepare_spec_test(test_case, test_dict)
+        self.assertEqual(args, [{'hits': [{'title': 'One'}]}])
+        test_case.add_context.assert_called_with(
+            'ctx', [{'title': 'One'}, {'title': 'Two'}])
+
+    def test_load_lazy_shared(self):
+        """
+        Fixtures without lazy values are shared rather than copied.
+        """
+        fixture = freeze({'a': [1, 2]})
+        self.assertIs(load_lazy(fixture), fixture)
+        loaded = load_lazy(freeze({'a': [1], 'b': LazyFixture(
+            os.path.join(self.root, 'results.ndjson'), stop=1)}))
+        self.assertEqual(loaded, {'a': [1], 'b': [{'title': 'One'}]})
+        with self.assertRaises(TypeError):
+            loaded['a'] = 1
+
+    def test_unresolvable_ref(self):
+        with self.assertRaises(ValueError):
+            resolve_refs({'$ref': '#/fixtures/missing'}, self.json_file, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
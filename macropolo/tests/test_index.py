@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from macropolo.index import MacroIndex, SpecWarning
+
+
+class MacroIndexTestCase(unittest.TestCase):
+    """
+    Tests for the index of macro signatures
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        with open(os.path.join(self.root, 'macros.html'), 'w') as f:
+            f.write("""
+                {% import "other.html" as other %}
+                {% macro listing(title, items=[], show=True) %}
+                    {% for item in queries(title) %}
+                        {{ item|upper|slugify }} {{ other.thing() }}
+                    {% endfor %}
+                    {{ footer(site_name) }}
+                {% endmacro %}
+                {% macro footer(name) %}{{ name }}{{ varargs }}{% endmacro %}
+            """)
+        self.index = MacroIndex([self.root])
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_signatures(self):
+        """
+        Macro parameters, defaults, filters and context names are
+        indexed without rendering.
+        """
+        macros = self.index.macros('macros.html')
+        listing = macros['listing']
+        self.assertEqual(listing.args, ['title', 'items', 'show'])
+        self.assertEqual(listing.defaults, {'items': [], 'show': True})
+        self.assertEqual(listing.filters, set(['upper', 'slugify']))
+        self.assertEqual(listing.names, set(['queries', 'site_name']))
+        self.assertFalse(listing.varargs)
+        self.assertTrue(macros['footer'].varargs)
+
+    def test_find(self):
+        found = self.index.find('footer')
+        self.assertEqual([m.file for m in found], ['macros.html'])
+
+    def test_check_test(self):
+        """
+        Unknown macros and bad arguments are rejected, and unmocked
+        filters and context names are warned about.
+        """
+        self.assertEqual(
+            self.index.check_test('macros.html', {'macro_name': 'nope'}),
+            'macro nope is not defined in macros.html')
+        self.assertEqual(
+            self.index.check_test('macros.html', {
+                'macro_name': 'listing', 'arguments': {'colour': 'red'}}),
+            'listing got an unexpected keyword argument colour')
+
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertIsNone(self.index.check_test('macros.html', {
+                'macro_name': 'listing',
+                'arguments': ['Title'],
+                'mock_context_functions': {'queries': []},
+            }))
+        messages = [str(w.message) for w in caught
+                    if issubclass(w.category, SpecWarning)]
+        self.assertEqual(len(messages), 2)
+        self.assertIn('filter slugify', messages[0])
+        self.assertIn('site_name', messages[1])
+
+    def test_environment_context(self):
+        """
+        Context the environment provides isn't warned about.
+        """
+        index = MacroIndex([self.root], known_filters=['slugify'],
+                           known_names=['site_name'])
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            index.check_test('macros.html', {
+                'macro_name': 'listing',
+                'arguments': ['Title'],
+                'mock_context_functions': {'queries': []},
+            })
+        self.assertEqual([w for w in caught
+                          if issubclass(w.category, SpecWarning)], [])
+
+    def test_syntax_error(self):
+        """
+        Tests of a template with a syntax error report the error rather
+        than missing macros.
+        """
+        with open(os.path.join(self.root, 'broken.html'), 'w') as f:
+            f.write('{% macro ok() %}OK{% endmacro %}\n'
+                    '{% macro bad() %}{% if %}{% endmacro %}')
+        error = self.index.check_test('broken.html', {'macro_name': 'ok'})
+        self.assertTrue(error.startswith('syntax error in broken.html '
+                                         'line 2: '), error)
+
+    def test_cache_file(self):
+        """
+        The index can be saved to and loaded from a cache file.
+        """
+        cache_file = os.path.join(self.root, 'index.json')
+        MacroIndex([self.root], cache_file=cache_file).build()
+        index = MacroIndex([self.root], cache_file=cache_file)
+        self.assertEqual(len(index.files), 1)
+        self.assertEqual(index.macros('macros.html')['listing'].args,
+                         ['title', 'items', 'show'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@
 
 import unittest
 import mock
+import jinja2
 from io import StringIO
 
 from macropolo import MacroTestCaseMixin
@@ -204,3 +205,58 @@ class Jinja2EnvironmentTestCase(unittest.TestCase):
         assert 'World' in result.text
 
 
+
+    @mock.patch('os.walk')
+    @mock.patch('jinja2.FileSystemLoader.get_source')
+    def test_bytecode_cache_filters(self, mock_loader_get_source,
+                                    mock_os_walk):
+        """
+        Templates compiled with a mock filter aren't reused by tests
+        that don't mock it.
+        """
+        macro_string = """
+            {% macro test_macro() %}{{ "A"|shout }}{% endmacro %}
+            {% macro other_macro() %}Other{% endmacro %}
+        """
+        mock_os_walk.return_value = [('/', (), 'macro.html')]
+        mock_loader_get_source.return_value = \
+                (macro_string, 'macro.html', None)
+
+        test_case = Jinja2MacroTestCase()
+        test_case.setUp()
+        test_case.mock_filter('shout', 'LOUD')
+        result = test_case.render_macro('macro.html', 'test_macro')
+        assert 'LOUD' in result.text
+
+        test_case = Jinja2MacroTestCase()
+        test_case.setUp()
+        self.assertRaises(jinja2.TemplateAssertionError,
+                          test_case.render_macro, 'macro.html',
+                          'other_macro')
+
+    @mock.patch('os.walk')
+    @mock.patch('jinja2.FileSystemLoader.get_source')
+    def test_loaded_template_sources(self, mock_loader_get_source,
+                                     mock_os_walk):
+        """
+        Test recording the templates loaded from the search paths
+        """
+        macro_string = """
+            {% macro test_macro() %}
+                {% import "who.html" as who with context %}
+                Hello {{ who.world() }}!
+            {% endmacro %}
+        """
+        mock_os_walk.return_value = [('/', (), 'macro.html')]
+        mock_loader_get_source.return_value = \
+                (macro_string, 'macro.html', None)
+
+        test_case = Jinja2MacroTestCase()
+        test_case.setUp()
+        test_case.mock_template_macro("who.html", "world()", "World")
+        test_case.render_macro('macro.html', 'test_macro')
+
+        self.assertEqual(test_case.loaded_template_sources(),
+                         {'macro.html': macro_string})
+        self.assertEqual(test_case.get_template_source('macro.html'),
+                         macro_string)
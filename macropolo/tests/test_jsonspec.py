@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import unittest
+import mock
+from io import StringIO
+
+from macropolo import JSONTestSuiteLoader, JSONSpecTestCaseFactory
+from macropolo.memory import MemoryTracingResult, tracemalloc
+from macropolo.history import RunHistory
+from macropolo.jsonspec import read_spec
+from macropolo.tests.helpers import SpecProjectTestCase
+
+
+class JSONSpecTestCase(SpecProjectTestCase):
+    """
+    Tests for loading and running JSON test specifications
+    """
+
+    def setUp(self):
+        super(JSONSpecTestCase, self).setUp()
+
+        self.write(self.templates_path, 'hello.html', """
+            {% macro hello(who) %}<p class="{{ who }}">Hello!</p>{% endmacro %}
+        """)
+        self.write(self.tests_path, 'hello.json', json.dumps({
+            'file': 'hello.html',
+            'tests': [{'macro_name': 'hello',
+                       'arguments': ['world'],
+                       'assertions': [{'selector': 'p',
+                                       'attribute': 'class',
+                                       'value': 'world',
+                                       'assertion': 'equal'}]}]
+        }))
+
+    def test_bounded_memory(self):
+        """
+        In bounded memory mode tests pass and release their
+        environments.
+        """
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class,
+                                    bounded_memory=True)
+        test = list(suite)[0]
+        result = unittest.TestResult()
+        test.run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertFalse(hasattr(test, 'env'))
+        self.assertFalse(hasattr(test, 'filters'))
+
+    def test_non_spec_json(self):
+        """
+        JSON files that aren't specs, e.g. fixtures, are skipped by the
+        loader and rejected by the factory.
+        """
+        self.write(self.tests_path, 'posts.json', json.dumps([{'id': 1}]))
+        with mock.patch('macropolo.jsonspec.read_spec',
+                        side_effect=read_spec) as read:
+            suite = JSONTestSuiteLoader(self.tests_path, self.super_class)
+        self.assertEqual(suite.countTestCases(), 1)
+        # Each file is only read and parsed once.
+        self.assertEqual(read.call_count, 2)
+        self.assertRaises(ValueError, JSONSpecTestCaseFactory, 'PostsTestCase',
+                          self.super_class,
+                          os.path.join(self.tests_path, 'posts.json'))
+
+    def test_stream(self):
+        """
+        Tests can render macros as a stream.
+        """
+        self.write(self.tests_path, 'hello.json', json.dumps({
+            'file': 'hello.html',
+            'tests': [{'macro_name': 'hello',
+                       'arguments': ['world'],
+                       'stream': True,
+                       'assertions': [{'selector': 'p.world'},
+                                      {'selector': 'p',
+                                       'attribute': 'class',
+                                       'value': 'world',
+                                       'assertion': 'equal'}]}]
+        }))
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class)
+        result = unittest.TestResult()
+        suite.run(result)
+        self.assertTrue(result.wasSuccessful())
+
+    def test_shard_by_test(self):
+        """
+        Each test is loaded by exactly one shard.
+        """
+        self.write(self.tests_path, 'hello.json', json.dumps({
+            'file': 'hello.html',
+            'tests': [{'macro_name': 'hello', 'arguments': [str(i)]}
+                      for i in range(6)]
+        }))
+        ids = []
+        for shard in ('1/3', '2/3', '3/3'):
+            suite = JSONTestSuiteLoader(self.tests_path, self.super_class,
+                                        shard=shard, shard_by='test')
+            ids.extend(t.id() for t in suite)
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+
+    def test_order_failed_first(self):
+        """
+        Tests that failed last time run first, then new tests, then the
+        longest.
+        """
+        self.write(self.tests_path, 'hello.json', json.dumps({
+            'file': 'hello.html',
+            'tests': [{'macro_name': 'hello', 'arguments': [str(i)]}
+                      for i in range(4)]
+        }))
+        history = RunHistory(os.path.join(self.root, 'history.json'))
+        history.record('hello.json::test_0hello', 'pass', 1.0)
+        history.record('hello.json::test_1hello', 'pass', 3.0)
+        history.record('hello.json::test_2hello', 'fail', 0.5)
+        history.save()
+
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class,
+                                    history=history.path,
+                                    order='failed-first')
+        self.assertEqual([t._testMethodName for t in suite],
+                         ['test_2hello', 'test_3hello',
+                          'test_1hello', 'test_0hello'])
+
+    def test_order_longest_first(self):
+        """
+        New tests run first, then the longest, whether they failed or
+        not.
+        """
+        self.write(self.tests_path, 'hello.json', json.dumps({
+            'file': 'hello.html',
+            'tests': [{'macro_name': 'hello', 'arguments': [str(i)]}
+                      for i in range(3)]
+        }))
+        history = RunHistory(os.path.join(self.root, 'history.json'))
+        history.record('hello.json::test_0hello', 'fail', 1.0)
+        history.record('hello.json::test_1hello', 'pass', 3.0)
+        history.save()
+
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class,
+                                    history=history.path,
+                                    order='longest-first')
+        self.assertEqual([t._testMethodName for t in suite],
+                         ['test_2hello', 'test_1hello', 'test_0hello'])
+
+    @unittest.skipIf(tracemalloc is None, "requires tracemalloc")
+    def test_memory_report(self):
+        """
+        MemoryTracingResult records a peak for each spec file.
+        """
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class)
+        result = MemoryTracingResult(StringIO(), True, 0)
+        suite.run(result)
+        self.assertTrue(result.wasSuccessful())
+        self.assertEqual(list(result.peaks),
+                         [os.path.join(self.tests_path, 'hello.json')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import unittest
+import multiprocessing
+
+from macropolo import MacroTestCase
+from macropolo.environments import Jinja2Environment
+from macropolo.mutation import (MutationTester, find_mutants, macro_spans,
+                                mutation_score, macro_calls, calling_macros)
+from macropolo.tests.helpers import SpecProjectTestCase
+
+
+class TemplateTestCase(Jinja2Environment, MacroTestCase):
+    """
+    A base test case defined at the top level of the module, so that it
+    can be used in worker processes.
+    """
+
+    templates_path = None
+
+    def search_root(self):
+        return self.templates_path
+
+    def search_exceptions(self):
+        return []
+
+
+class MutationTestCase(SpecProjectTestCase):
+    """
+    Tests for mutation testing of macros
+    """
+
+    source = """
+        {% macro list(items, title) %}
+          {% if title %}<h2 class="title">{{ title|upper }}</h2>{% endif %}
+          <ul>{% for i in items %}<li>{{ i }}</li>{% else %}<li>None</li>{% endfor %}</ul>
+        {% endmacro %}
+        {% macro page(items) %}<div>{{ list(items, 'Items') }}</div>{% endmacro %}
+        {% macro other() %}<p>Other</p>{% endmacro %}
+    """
+
+    def setUp(self):
+        super(MutationTestCase, self).setUp()
+
+        self.write(self.templates_path, 'list.html', self.source)
+        self.write(self.tests_path, 'list.json', json.dumps({
+            'file': 'list.html',
+            'tests': [{'macro_name': 'list',
+                       'arguments': [[1, 2], 'Hi'],
+                       'assertions': [{'selector': 'li', 'index': 1},
+                                      {'selector': 'h2'}]},
+                      {'macro_name': 'page',
+                       'arguments': [[]],
+                       'assertions': [{'selector': 'div'}]},
+                      {'macro_name': 'other',
+                       'assertions': [{'selector': 'p'}]}]
+        }))
+
+        TemplateTestCase.templates_path = self.templates_path
+
+    def tearDown(self):
+        TemplateTestCase.templates_path = None
+        super(MutationTestCase, self).tearDown()
+
+    def test_find_mutants(self):
+        spans = macro_spans(self.source)
+        self.assertEqual(sorted(spans), ['list', 'other', 'page'])
+        calls = macro_calls(self.source, spans)
+        self.assertEqual(calls['page'], set(['list']))
+        self.assertEqual(calling_macros('list', calls),
+                         set(['list', 'page']))
+
+        mutants = find_mutants('list.html', self.source)
+        self.assertEqual(
+            sorted((m.macro, m.operator, m.description) for m in mutants),
+            [('list', 'drop-attribute', 'drop attribute class="title"'),
+             ('list', 'flip-condition', 'if title -> if not (title)'),
+             ('list', 'remove-loop-body', 'remove body of for i in items'),
+             ('list', 'swap-filter', '|upper -> |lower')])
+        flipped = [m for m in mutants if m.operator == 'flip-condition'][0]
+        self.assertIn('{% if not (title) %}', flipped.source)
+        self.assertEqual(flipped.lineno, 3)
+
+    def run_mutants(self, processes):
+        tester = MutationTester(self.tests_path, TemplateTestCase,
+                                processes=processes)
+        results = dict((m.operator, (status, test_id))
+                       for m, status, test_id in tester.run())
+
+        # The tests of list and of page, which calls it, are rerun.
+        self.assertEqual(results['remove-loop-body'],
+                         ('killed', 'list.json::test_0list'))
+        self.assertEqual(results['flip-condition'],
+                         ('killed', 'list.json::test_0list'))
+        self.assertEqual(results['drop-attribute'], ('survived', None))
+        self.assertEqual(results['swap-filter'], ('survived', None))
+
+    def test_mutation_tester(self):
+        self.run_mutants(processes=1)
+
+    @unittest.skipUnless(
+        multiprocessing.get_start_method(allow_none=True) in (None, 'fork')
+        and hasattr(os, 'fork'),
+        "worker processes need to inherit the templates path")
+    def test_mutation_tester_processes(self):
+        self.run_mutants(processes=2)
+
+    def test_tests_for(self):
+        tester = MutationTester(self.tests_path, TemplateTestCase,
+                                processes=1)
+        tests = tester.passing_tests()
+        self.assertEqual(len(tests), 3)
+        mutant = find_mutants('list.html', self.source,
+                              operators=['flip-condition'])[0]
+        self.assertEqual(tester.tests_for(mutant, tests),
+                         ['list.json::test_0list', 'list.json::test_1page'])
+
+    def test_tests_for_indirect_calls(self):
+        """
+        Tests of a macro render the macros it calls through other macros
+        in the same template.
+        """
+        self.write(self.templates_path, 'chain.html', """
+            {% macro inner(x) %}{% if x %}<b class="yes">Y</b>{% endif %}{% endmacro %}
+            {% macro mid(x) %}<i>{{ inner(x) }}</i>{% endmacro %}
+            {% macro outer() %}<div>{{ mid(True) }}</div>{% endmacro %}
+        """)
+        self.write(self.tests_path, 'chain.json', json.dumps({
+            'file': 'chain.html',
+            'tests': [{'macro_name': 'outer',
+                       'assertions': [{'selector': 'b.yes'}]}]
+        }))
+        tester = MutationTester(self.tests_path, TemplateTestCase,
+                                processes=1, templates=['chain.html'])
+        results = tester.run()
+        self.assertEqual(sorted((m.macro, status)
+                                for m, status, test_id in results),
+                         [('inner', 'killed'), ('inner', 'killed')])
+
+    def test_mutation_score(self):
+        self.assertEqual(mutation_score([]), 1.0)
+        self.assertEqual(mutation_score([(None, 'killed', 't'),
+                                         (None, 'survived', None),
+                                         (None, 'uncovered', None),
+                                         (None, 'killed', 't')]), 0.5)
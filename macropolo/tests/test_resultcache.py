@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+from macropolo import JSONTestSuiteLoader
+from macropolo.history import RecordingResult, RunHistory
+from macropolo.resultcache import ResultCache, spec_inputs
+from macropolo.tests.helpers import SpecProjectTestCase
+
+
+class ResultCacheTestCase(SpecProjectTestCase):
+    """
+    Tests for skipping unchanged JSON spec tests
+    """
+
+    def setUp(self):
+        super(ResultCacheTestCase, self).setUp()
+        self.cache_file = os.path.join(self.root, 'cache.json')
+
+        self.write(self.templates_path, 'hello.html', """
+            {% import "names.html" as names %}
+            {% macro hello() %}<p class="{{ names.world() }}">Hi</p>{% endmacro %}
+        """)
+        self.write(self.templates_path, 'names.html', """
+            {% macro world() %}World{% endmacro %}
+        """)
+        self.write(self.templates_path, 'bye.html', """
+            {% macro bye() %}<p>Bye!</p>{% endmacro %}
+        """)
+        self.write(self.tests_path, 'hello.json', json.dumps({
+            'file': 'hello.html',
+            'tests': [{'macro_name': 'hello',
+                       'assertions': [{'selector': 'p', 'value': 'World',
+                                       'attribute': 'class',
+                                       'assertion': 'equal'}]}]
+        }))
+        self.write(self.tests_path, 'bye.json', json.dumps({
+            'file': 'bye.html',
+            'tests': [{'macro_name': 'bye',
+                       'assertions': [{'selector': 'p'}]}]
+        }))
+
+    def run_specs(self, force=False):
+        """
+        Run the specs with the result cache and return the status of
+        each test by id.
+        """
+        cache = ResultCache(self.cache_file, force=force)
+        suite = JSONTestSuiteLoader(self.tests_path, self.super_class,
+                                    result_cache=cache)
+        result = RecordingResult(None, False, 0)
+        suite.run(result)
+        cache.save()
+        return {r['id']: r['status'] for r in result.records}
+
+    def test_unchanged_tests_cached(self):
+        """
+        Only tests whose spec or (imported) templates changed since they
+        passed are rerun.
+        """
+        self.assertEqual(self.run_specs(), {'hello.json::test_0hello': 'pass',
+                                            'bye.json::test_0bye': 'pass'})
+        self.assertEqual(self.run_specs(),
+                         {'hello.json::test_0hello': 'cached',
+                          'bye.json::test_0bye': 'cached'})
+
+        self.write(self.templates_path, 'names.html', """
+            {% macro world() %}Everyone{% endmacro %}
+        """)
+        self.assertEqual(self.run_specs(), {'hello.json::test_0hello': 'fail',
+                                            'bye.json::test_0bye': 'cached'})
+        self.assertEqual(self.run_specs()['hello.json::test_0hello'], 'fail')
+
+        self.write(self.tests_path, 'bye.json', json.dumps({
+            'file': 'bye.html',
+            'tests': [{'macro_name': 'bye',
+                       'assertions': [{'selector': 'p', 'index': 0}]}]
+        }))
+        self.assertEqual(self.run_specs()['bye.json::test_0bye'], 'pass')
+        self.assertEqual(self.run_specs(force=True)['bye.json::test_0bye'],
+                         'pass')
+
+    def test_versions(self):
+        """
+        Cached results are discarded when the versions change.
+        """
+        self.run_specs()
+        with open(self.cache_file) as f:
+            cached = json.load(f)
+        cached['versions']['jinja2'] = '0.0'
+        with open(self.cache_file, 'w') as f:
+            json.dump(cached, f)
+        self.assertEqual(ResultCache(self.cache_file).tests, {})
+
+    def test_spec_hash_fixture_files(self):
+        """
+        Spec hashes change when a fixture file the test refers to does,
+        and fixture files are read once while they're unchanged.
+        """
+        json_file = os.path.join(self.tests_path, 'hello.json')
+        spec = {'file': 'hello.html'}
+        test_dict = {'macro_name': 'hello',
+                     'context': {'data': {'$ref': 'data.json'}}}
+        self.write(self.tests_path, 'data.json', '{"a": 1}')
+        inputs = spec_inputs(test_dict, spec, json_file)
+        cache = ResultCache(self.cache_file)
+        first = cache.spec_hash(inputs)
+        self.assertEqual(cache.spec_hash(inputs), first)
+        self.assertEqual(len(cache.file_hashes), 1)
+        self.write(self.tests_path, 'data.json', '{"a": 22}')
+        self.assertNotEqual(cache.spec_hash(inputs), first)
+
+    def test_history_keeps_cached_durations(self):
+        """
+        Cached tests keep the duration of the run that passed.
+        """
+        history = RunHistory(os.path.join(self.root, 'history.json'))
+        history.record_results([{'id': 'a', 'status': 'pass',
+                                 'duration': 2.0}])
+        history.record_results([{'id': 'a', 'status': 'cached',
+                                 'duration': 0.001},
+                                {'id': 'b', 'status': 'cached',
+                                 'duration': 0.001}])
+        self.assertEqual(history.tests, {
+            'a': {'status': 'pass', 'duration': 2.0},
+            'b': {'status': 'pass', 'duration': 0.0}})
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from xml.etree import ElementTree
+
+from macropolo.sharding import parse_shard, assign_shards, hash_shard
+from macropolo.history import junit_xml, RecordingResult
+
+
+class ShardingTestCase(unittest.TestCase):
+    """
+    Tests for assigning specs to CI shards
+    """
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('2/8'), (2, 8))
+        with self.assertRaises(ValueError):
+            parse_shard('0/8')
+        with self.assertRaises(ValueError):
+            parse_shard('9/8')
+        with self.assertRaises(ValueError):
+            parse_shard('two')
+
+    def test_assign_shards_balances_durations(self):
+        """
+        Items with recorded durations are assigned longest first to the
+        least loaded shard.
+        """
+        durations = {'a': 10.0, 'b': 6.0, 'c': 5.0, 'd': 1.0}
+        assignment = assign_shards(['a', 'b', 'c', 'd'], 2, durations)
+        self.assertEqual(assignment, {'a': 1, 'b': 2, 'c': 2, 'd': 1})
+
+    def test_assign_shards_new_items(self):
+        """
+        Items without recorded durations are assigned by a stable hash.
+        """
+        items = ['spec{}.json'.format(i) for i in range(20)]
+        assignment = assign_shards(items, 4, {})
+        self.assertEqual(assignment, assign_shards(items, 4, {}))
+        self.assertTrue(set(assignment.values()) <= set([1, 2, 3, 4]))
+
+    def test_hash_shard(self):
+        """
+        Hashes are unsigned, so shards are the same on Python 2 and 3.
+        """
+        self.assertEqual(hash_shard('spec1.json', 3), 3)
+
+
+class JUnitXMLTestCase(unittest.TestCase):
+    """
+    Tests for merging test records into JUnit XML
+    """
+
+    def test_recording_result_fixture_errors(self):
+        """
+        Errors raised by class fixtures are recorded by themselves,
+        rather than changing the record of the previous test.
+        """
+        class A(unittest.TestCase):
+            def test_a(self):
+                pass
+
+        class B(unittest.TestCase):
+            @classmethod
+            def setUpClass(cls):
+                raise RuntimeError('broken')
+
+            def test_b(self):
+                pass
+
+        suite = unittest.TestSuite([A('test_a'), B('test_b')])
+        result = RecordingResult(None, False, 0)
+        suite.run(result)
+        self.assertEqual([r['status'] for r in result.records],
+                         ['pass', 'error'])
+        self.assertTrue(result.records[0]['id'].endswith('.test_a'))
+        self.assertTrue(result.records[1]['id'].startswith('setUpClass'))
+        self.assertIn('broken', result.records[1]['message'])
+
+    def test_junit_xml(self):
+        records = [
+            {'id': 'a.json::test_0m', 'status': 'pass', 'duration': 0.5},
+            {'id': 'a.json::test_1m', 'status': 'fail', 'duration': 0.25,
+             'message': 'Traceback\nAssertionError: nope\n'},
+            {'id': 'b.json::test_0n', 'status': 'skip', 'duration': 0.0,
+             'message': 'skipping n'},
+        ]
+        root = ElementTree.fromstring(junit_xml(records))
+        suites = root.findall('testsuite')
+        self.assertEqual([s.get('name') for s in suites],
+                         ['a.json', 'b.json'])
+        self.assertEqual(suites[0].get('tests'), '2')
+        self.assertEqual(suites[0].get('failures'), '1')
+        failure = suites[0].find('testcase/failure')
+        self.assertEqual(failure.get('message'), 'AssertionError: nope')
+        self.assertEqual(suites[1].get('skipped'), '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from macropolo import MacroTestCaseMixin
+from macropolo.streaming import StreamingResult, simple_selector
+
+
+class StreamingResultTestCase(unittest.TestCase):
+    """
+    Tests for incrementally rendered and parsed macro results
+    """
+
+    def test_simple_selector(self):
+        matches = simple_selector('a.button#go[href][data-x="1"]')
+        self.assertTrue(matches('a', [('class', 'big button'), ('id', 'go'),
+                                      ('href', '/'), ('data-x', '1')]))
+        self.assertFalse(matches('a', [('class', 'button'), ('id', 'go'),
+                                       ('data-x', '1')]))
+        self.assertFalse(matches('span', [('class', 'button'),
+                                          ('id', 'go'), ('href', '/'),
+                                          ('data-x', '1')]))
+
+        # Combinators and pseudo-classes aren't simple selectors.
+        self.assertIsNone(simple_selector('ul li'))
+        self.assertIsNone(simple_selector('ul > li'))
+        self.assertIsNone(simple_selector('li:first-child'))
+
+    def test_exists_stops_early(self):
+        """
+        exists() stops rendering once the element has been found.
+        """
+        def chunks():
+            yield u'<ul><li class="a">1</li>'
+            yield u'<li class="b">2</li>'
+            raise AssertionError("rendered too much")
+
+        result = StreamingResult(chunks())
+        self.assertTrue(result.exists('li', 1))
+        self.assertTrue(result.exists('.a'))
+        result.decompose()
+
+    def test_exists_large_chunk(self):
+        """
+        Large chunks are parsed a piece at a time.
+        """
+        html = u'<p id="first"></p>' + u'<p></p>' * 1000
+        result = StreamingResult(iter([html]), chunk_size=64)
+        self.assertTrue(result.exists('#first'))
+        self.assertLess(len(result.parser.start_tags), 20)
+
+        # The chunk is kept as it is, not copied in pieces, for select().
+        self.assertIs(result.rendered[0], html)
+        self.assertEqual(len(result.select('p')), 1001)
+
+    def test_exists_missing(self):
+        result = StreamingResult(iter([u'<p>', u'</p>']))
+        self.assertFalse(result.exists('p', 1))
+        self.assertFalse(result.exists('span'))
+
+    def test_select(self):
+        """
+        Other assertions render the whole document.
+        """
+        result = StreamingResult(iter([u'<ul><li>1</li>', u'<li>2</li>']))
+        self.assertTrue(result.exists('ul li', 1))
+        self.assertEqual([li.text for li in result.select('li')],
+                         ['1', '2'])
+
+    def test_make_assertion(self):
+        test_case = MacroTestCaseMixin()
+        result = StreamingResult(iter([u'<span class="foo">Test</span>']))
+        test_case.make_assertion(result, '.foo', assertion='exists')
+        test_case.make_assertion(result, '.foo', value='foo',
+                                 assertion='equal', attribute='class')
+        with self.assertRaises(AssertionError):
+            test_case.make_assertion(result, '.bar', assertion='exists')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import mock
+import jinja2
+
+from macropolo import MacroTestCaseMixin
+from macropolo.environments import Jinja2Environment
+from macropolo.tracing import CallTracer
+
+
+class TracedMacroTestCase(Jinja2Environment, MacroTestCaseMixin):
+    """
+    A subclass to test call tracing with Jinja2Environment.
+    """
+
+    def search_root(self):
+        return "."
+
+    def search_exceptions(self):
+        return None
+
+
+class CallTracerTestCase(unittest.TestCase):
+    """
+    Tests for counting filter and context function calls per render
+    """
+
+    macro_string = """
+        {% macro list_docs(ids) %}
+            {% for id in ids %}
+                <p>{{ get_document(id)|shout }} {{ id|label }}</p>
+            {% endfor %}
+        {% endmacro %}
+    """
+
+    def setUp(self):
+        self.tracer = CallTracer()
+        TracedMacroTestCase.call_tracer = self.tracer
+
+    def tearDown(self):
+        TracedMacroTestCase.call_tracer = None
+
+    @mock.patch('os.walk')
+    @mock.patch('jinja2.FileSystemLoader.get_source')
+    def test_calls_per_render(self, mock_loader_get_source, mock_os_walk):
+        """
+        Calls to mock and real filters and mock context functions are
+        counted for each macro render.
+        """
+        mock_os_walk.return_value = [('/', (), 'macro.html')]
+        mock_loader_get_source.return_value = \
+                (self.macro_string, 'macro.html', None)
+
+        # jinja2.pass_context replaced contextfilter in Jinja2 3.0.
+        pass_context = getattr(jinja2, 'pass_context', None) or \
+            jinja2.contextfilter
+
+        @pass_context
+        def label(context, value):
+            return 'label-{}'.format(value)
+
+        for ids in ([1, 2, 3], [1, 1]):
+            test_case = TracedMacroTestCase()
+            test_case.setUp()
+            test_case.mock_context_function('get_document', 'doc')
+            test_case.mock_filter('shout', 'DOC')
+            test_case.add_filter('label', label)
+            result = test_case.render_macro('macro.html', 'list_docs', ids)
+            assert 'DOC label-1' in result.text
+
+        stats = self.tracer.stats['macro.html:list_docs']
+        self.assertEqual(stats['renders'], 2)
+        documents = stats['calls']['get_document (context function)']
+        self.assertEqual(documents['calls'], 5)
+        self.assertEqual(documents['max'], 3)
+        self.assertEqual(len(documents['arguments']), 3)
+        self.assertEqual(stats['calls']['label (filter)']['calls'], 5)
+
+        report = self.tracer.report().splitlines()
+        self.assertEqual(len(report), 4)
+        self.assertIn('2.5     3         3  macro.html:list_docs: '
+                      'get_document (context function)', report[1])
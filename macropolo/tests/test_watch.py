@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import unittest
+from io import StringIO
+
+from macropolo.watch import SpecWatcher
+from macropolo.tests.helpers import SpecProjectTestCase
+
+
+class SpecWatcherTestCase(SpecProjectTestCase):
+    """
+    Tests for SpecWatcher, which reruns the specs affected by changes
+    """
+
+    def setUp(self):
+        super(SpecWatcherTestCase, self).setUp()
+
+        self.write(self.templates_path, 'who.html', """
+            {% macro who() %}World{% endmacro %}
+        """)
+        self.write(self.templates_path, 'hello.html', """
+            {% macro hello() %}
+                {% import "who.html" as w %}
+                <p>Hello {{ w.who() }}!</p>
+            {% endmacro %}
+        """)
+        self.write(self.templates_path, 'goodbye.html', """
+            {% macro goodbye() %}<p>Goodbye!</p>{% endmacro %}
+        """)
+        self.write(self.tests_path, 'hello.json', json.dumps({
+            'file': 'hello.html',
+            'tests': [{'macro_name': 'hello',
+                       'assertions': [{'selector': 'p'}]}]
+        }))
+        self.write(self.tests_path, 'goodbye.json', json.dumps({
+            'file': 'goodbye.html',
+            'tests': [{'macro_name': 'goodbye',
+                       'context': {'post': {'$ref': 'fixtures/post.json'}},
+                       'assertions': [{'selector': 'p'}]}]
+        }))
+        os.mkdir(os.path.join(self.tests_path, 'fixtures'))
+        self.write(os.path.join(self.tests_path, 'fixtures'), 'post.json',
+                   json.dumps({'title': 'A Post'}))
+        self.write(self.tests_path, 'posts.json', json.dumps([{'id': 1}]))
+
+        self.watcher = SpecWatcher(self.tests_path, self.super_class,
+                                   stream=StringIO())
+
+    def test_affected_specs_changed_spec(self):
+        """
+        A changed spec is rerun by itself.
+        """
+        spec = os.path.join(self.tests_path, 'goodbye.json')
+        self.assertEqual(self.watcher.affected_specs([spec]), set([spec]))
+
+    def test_affected_specs_changed_template(self):
+        """
+        A changed template reruns the specs of every template that
+        imports it.
+        """
+        changed = [os.path.join(self.templates_path, 'who.html')]
+        self.assertEqual(self.watcher.affected_specs(changed),
+                         set([os.path.join(self.tests_path, 'hello.json')]))
+
+    def test_affected_specs_changed_fixture(self):
+        """
+        A changed fixture file reruns the specs that refer to it.
+        """
+        fixture = os.path.join(self.tests_path, 'fixtures', 'post.json')
+        self.assertIn(fixture, self.watcher.mtimes)
+        self.assertEqual(self.watcher.affected_specs([fixture]),
+                         set([os.path.join(self.tests_path, 'goodbye.json')]))
+
+    def test_spec_files(self):
+        """
+        JSON files that aren't specs aren't run.
+        """
+        self.assertEqual(self.watcher.spec_files(),
+                         [os.path.join(self.tests_path, 'goodbye.json'),
+                          os.path.join(self.tests_path, 'hello.json')])
+
+    def test_run(self):
+        """
+        The tests in the given specs are run.
+        """
+        result = self.watcher.run(self.watcher.spec_files())
+        self.assertEqual(result.testsRun, 2)
+        self.assertTrue(result.wasSuccessful())
+
+
+if __name__ == '__main__':
+    unittest.main()
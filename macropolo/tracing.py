@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Attributes Jinja2 uses to decide what to pass to filters and context
+# functions, e.g. `jinja2.pass_context` (Jinja2 3.x) or
+# `jinja2.contextfilter` (Jinja2 2.x).
+PASS_ARG_ATTRIBUTES = ('jinja_pass_arg', 'contextfilter', 'evalcontextfilter',
+                       'environmentfilter', 'contextfunction',
+                       'evalcontextfunction', 'environmentfunction')
+
+
+def arguments_key(args, kwargs):
+    """
+    Return a hash of the given call arguments, used to count how many
+    distinct arguments a function is called with.
+    """
+    key = (args, tuple(sorted(kwargs.items())))
+    try:
+        return hash(key)
+    except TypeError:
+        # Unhashable arguments, e.g. dicts from a JSON spec.
+        return hash(repr(key))
+
+
+class TracedCallable(object):
+    """
+    A wrapper for a filter or context function that reports each call
+    to a `CallTracer` before calling it.
+    """
+
+    def __init__(self, func, tracer, name):
+        self.func = func
+        self.tracer = tracer
+        self.name = name
+
+        # Only copy attributes the function really has: a mock has every
+        # attribute.
+        attributes = getattr(func, '__dict__', {})
+        for attr in PASS_ARG_ATTRIBUTES:
+            if attr in attributes:
+                setattr(self, attr, attributes[attr])
+
+    def __call__(self, *args, **kwargs):
+        self.tracer.record(self.name, args, kwargs)
+        return self.func(*args, **kwargs)
+
+
+class CallTracer(object):
+    """
+    Counts the calls to the filters and context functions it wraps made
+    by each macro render, e.g. to find macros that call a context
+    function that queries a database in a loop.
+
+    For each macro, `stats` holds the number of renders and, for each
+    wrapped filter or context function it called, the total number of
+    calls, the most calls in one render, and the number of distinct
+    arguments it was called with.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.current = None
+
+    def wrap(self, kind, name, func):
+        """
+        Return a wrapper for the given filter or context function of the
+        given kind ('filter' or 'context function') that counts its
+        calls.
+        """
+        return TracedCallable(func, self, '{} ({})'.format(name, kind))
+
+    def begin_render(self, macro):
+        """
+        Attribute the calls that follow to a render of the given macro.
+        """
+        stats = self.stats.setdefault(macro, {'renders': 0, 'calls': {}})
+        stats['renders'] += 1
+        self.current = (stats['calls'], {})
+
+    def record(self, name, args, kwargs):
+        if self.current is None:
+            return
+        calls, render_counts = self.current
+        count = render_counts[name] = render_counts.get(name, 0) + 1
+        entry = calls.get(name)
+        if entry is None:
+            entry = calls[name] = {'calls': 0, 'max': 0, 'arguments': set()}
+        entry['calls'] += 1
+        entry['max'] = max(entry['max'], count)
+        entry['arguments'].add(arguments_key(args, kwargs))
+
+    def report(self, limit=None):
+        """
+        Return a report of the filters and context functions each macro
+        calls, the most called per render first.
+        """
+        rows = []
+        for macro, stats in self.stats.items():
+            for name, entry in stats['calls'].items():
+                rows.append((float(entry['calls']) / stats['renders'],
+                             entry['max'], macro, name,
+                             len(entry['arguments'])))
+        rows.sort(key=lambda r: (-r[0], -r[1], r[2], r[3]))
+        if limit is not None:
+            rows = rows[:limit]
+
+        lines = ['{:>9} {:>5} {:>9}  {}'.format(
+            'calls', 'max', 'distinct', 'macro: filter or function')]
+        for per_render, most, macro, name, distinct in rows:
+            lines.append('{:>9.1f} {:>5} {:>9}  {}: {}'.format(
+                per_render, most, distinct, macro, name))
+        return '\n'.join(lines) + '\n'
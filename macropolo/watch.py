@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import unittest
+
+from .index import TemplateReferences
+from .jsonspec import (JSONSpecTestCaseFactory, spec_class_name,
+                       read_spec, is_spec)
+from .resultcache import referenced_files
+from .environments.jinja2_env import clear_environment_caches
+
+
+class SpecWatcher(object):
+    """
+    Watch the JSON specs in `tests_path`, the fixture files they refer
+    to and the templates under the search root of `super_class`, and
+    rerun only the specs affected by each change.
+
+    The watcher runs in a single long-lived process, so the search
+    paths, the compiled templates (through the shared bytecode cache of
+    `Jinja2Environment`) and the template dependency graph stay warm
+    between runs. Files are polled for changes every `interval` seconds.
+    """
+
+    def __init__(self, tests_path, super_class, interval=0.25,
+                 stream=sys.stderr):
+        self.tests_path = os.path.abspath(tests_path)
+        self.super_class = super_class
+        self.interval = interval
+        self.stream = stream
+
+        # Keep the search paths warm between runs.
+        super_class.cache_search_paths = True
+
+        # The contents of each JSON file in `tests_path`, keyed by file
+        # path, along with the mtime it was read at.
+        self._specs = {}
+
+        self.refresh_search_paths()
+        self.mtimes = self.snapshot()
+
+    def refresh_search_paths(self):
+        """
+        Walk the search root of `super_class` again, e.g. after a
+        template has been added or removed.
+        """
+        clear_environment_caches()
+        probe = self.super_class()
+        probe.setup_environment()
+        self.search_paths = probe.search_paths
+        self.references = TemplateReferences(self.search_paths)
+
+    def read_spec(self, spec_file):
+        """
+        Return the JSON value in the given file, or None if it can't be
+        read.
+        """
+        mtime = os.path.getmtime(spec_file)
+        cached = self._specs.get(spec_file)
+        if cached is None or cached[0] != mtime:
+            try:
+                spec = read_spec(spec_file)
+            except ValueError:
+                spec = None
+            cached = (mtime, spec)
+            self._specs[spec_file] = cached
+        return cached[1]
+
+    def spec_files(self):
+        """
+        Return the paths of all JSON specs in `tests_path`. Other JSON
+        files, e.g. fixtures, are left out, but specs that can't be read
+        are included so the error is reported.
+        """
+        spec_files = []
+        for f in sorted(os.listdir(self.tests_path)):
+            path = os.path.join(self.tests_path, f)
+            if f.endswith('.json') and os.path.isfile(path):
+                spec = self.read_spec(path)
+                if spec is None or is_spec(spec):
+                    spec_files.append(path)
+        return spec_files
+
+    def fixture_files(self, spec_file):
+        """
+        Return the paths of the fixture files the given JSON spec refers
+        to with `$ref` or `$lazy`.
+        """
+        directory = os.path.dirname(spec_file)
+        return set(os.path.normpath(os.path.join(directory, path))
+                   for path in referenced_files(self.read_spec(spec_file)))
+
+    def snapshot(self):
+        """
+        Return a dict of the mtimes of all specs, of the fixture files
+        they refer to and of all files in the search paths.
+        """
+        mtimes = {}
+        for spec_file in self.spec_files():
+            for path in self.fixture_files(spec_file):
+                if os.path.isfile(path):
+                    mtimes[path] = os.path.getmtime(path)
+        directories = [self.tests_path] + list(self.search_paths)
+        for directory in directories:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(os.path.abspath(directory), name)
+                if os.path.isfile(path):
+                    mtimes[path] = os.path.getmtime(path)
+        return mtimes
+
+    def poll(self):
+        """
+        Return the set of paths that have been modified, added or
+        removed since the last poll.
+        """
+        mtimes = self.snapshot()
+        changed = set(path for path in set(mtimes) | set(self.mtimes)
+                      if mtimes.get(path) != self.mtimes.get(path))
+        if set(mtimes) != set(self.mtimes):
+            self.refresh_search_paths()
+            mtimes = self.snapshot()
+        self.mtimes = mtimes
+        return changed
+
+    def template_names(self, path):
+        """
+        Return the names the template at `path` can be loaded by.
+        """
+        path = os.path.abspath(path)
+        names = set()
+        for search_path in self.search_paths:
+            search_path = os.path.abspath(search_path)
+            if path.startswith(search_path + os.sep):
+                names.add(os.path.relpath(path, search_path)
+                          .replace(os.sep, '/'))
+        return names
+
+    def dependencies(self, name):
+        """
+        Return the names of the given template and every template it
+        transitively references.
+        """
+        return self.references.dependencies(name)
+
+    def spec_template(self, spec_file):
+        """
+        Return the template file the given JSON spec tests, or None if
+        the spec can't be read.
+        """
+        spec = self.read_spec(spec_file)
+        return spec.get('file') if spec is not None else None
+
+    def affected_specs(self, changed):
+        """
+        Return the JSON specs that need to be rerun for the given
+        changed paths: changed specs themselves, any spec that refers to
+        a changed fixture file, and any spec whose template depends on a
+        changed template.
+        """
+        spec_files = self.spec_files()
+        specs = set()
+        templates = set()
+        for path in changed:
+            if path in spec_files:
+                if os.path.exists(path):
+                    specs.add(path)
+                continue
+            specs.update(s for s in spec_files
+                         if path in self.fixture_files(s))
+            templates.update(self.template_names(path))
+
+        if templates:
+            for spec_file in spec_files:
+                template = self.spec_template(spec_file)
+                # Rerun specs we can't read so the error is reported.
+                if template is None or \
+                        self.dependencies(template) & templates:
+                    specs.add(spec_file)
+
+        return specs
+
+    def run(self, spec_files):
+        """
+        Run the tests in the given JSON specs and return the result.
+        """
+        loader = unittest.TestLoader()
+        suite = unittest.TestSuite()
+        for spec_file in sorted(spec_files):
+            try:
+                test_class = JSONSpecTestCaseFactory(
+                    spec_class_name(spec_file), self.super_class, spec_file,
+                    spec=self.read_spec(spec_file))
+            except (ValueError, KeyError) as e:
+                self.stream.write('Unable to load {}: {}\n'.format(
+                    spec_file, e))
+                continue
+            suite.addTests(loader.loadTestsFromTestCase(test_class))
+
+        runner = unittest.TextTestRunner(stream=self.stream)
+        return runner.run(suite)
+
+    def watch(self):
+        """
+        Run all specs, then poll for changes and rerun the affected
+        specs until interrupted.
+        """
+        self.run(self.spec_files())
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = self.poll()
+                if not changed:
+                    continue
+                specs = self.affected_specs(changed)
+                if specs:
+                    self.stream.write('\n{} changed, rerunning {}\n'.format(
+                        ', '.join(sorted(os.path.basename(p)
+                                         for p in changed)),
+                        ', '.join(os.path.basename(s)
+                                  for s in sorted(specs))))
+                    self.run(specs)
+        except KeyboardInterrupt:
+            pass
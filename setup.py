@@ -14,4 +14,9 @@ setup(
         'beautifulsoup4',
         'mock',
     ],
+    entry_points={
+        'console_scripts': [
+            'macropolo = macropolo.cli:main',
+        ],
+    },
 )